@@ -17,38 +17,64 @@ Features:
 - Hotword activation
 """
 
+import argparse
 import os
+import re
 import sys
 import time
 import threading
-import wikipedia
 import pywhatkit
 from datetime import datetime
 
 # Import our modules
 from speech import SpeechEngine
-from utils import get_greeting, get_current_time, get_current_date, open_website, open_application
+from utils import get_greeting, get_current_time, get_current_date, open_website, open_application, open_file
 from memory import Memory
 from reminders import ReminderSystem
 from api_services import APIServices
 from email_service import EmailService
+from prefetch import Prefetcher
+from intents import Intent, IntentRunner, parse_intent, split_query
+from music_library import MusicLibrary
+from app_catalog import ApplicationCatalog
+from profiler import CommandProfiler, command_label
 import config
 
 class VoiceAssistant:
-    def __init__(self):
-        """Initialize the voice assistant"""
+    def __init__(self, profiler: CommandProfiler = None):
+        """
+        Initialize the voice assistant
+        
+        Args:
+            profiler: Profiles every command when given (--profile)
+        """
         print(f"Initializing {config.ASSISTANT_NAME}...")
+        self.profiler = profiler
         
         # Initialize components
         self.speech = SpeechEngine()
         self.memory = Memory()
         self.apis = APIServices()
+        # Personalize LLM answers with what the assistant remembers
+        self.apis.llm.context_provider = self.memory.relevant_context
         self.email = EmailService()
-        self.reminders = ReminderSystem(self.speech.speak)
+        self.reminders = ReminderSystem(self.speech.announce)
+        self.prefetcher = Prefetcher(self.apis)
+        self.intents = IntentRunner(self.apis, self.reminders)
+        self.music = MusicLibrary()
+        self.apps = ApplicationCatalog()
         
         # Start reminder checking in background
         self.reminders.start()
         
+        # Bring the music and application indexes up to date without delaying startup
+        threading.Thread(target=self.music.refresh, daemon=True).start()
+        threading.Thread(target=self.apps.refresh, daemon=True).start()
+        
+        # Warm connections and caches whenever the assistant is idle
+        if config.PREFETCH_ENABLED:
+            self.prefetcher.start()
+        
         # Set running state
         self.is_running = False
         self.is_listening_for_wake_word = False
@@ -63,7 +89,7 @@ class VoiceAssistant:
             success, query = self.speech.listen()
             
             if success:
-                self.process_command(query)
+                self.handle_command(query)
             else:
                 # If error is not just timeout
                 if query != "Timeout":
@@ -76,14 +102,18 @@ class VoiceAssistant:
         
         while self.is_listening_for_wake_word:
             if self.speech.listen_for_wake_word():
-                self.speech.speak("I'm listening.")
-                success, query = self.speech.listen()
-                
-                if success:
-                    self.process_command(query)
-                else:
-                    if query != "Timeout":
-                        self.speech.speak("I couldn't understand. Please try again.")
+                self.prefetcher.begin_interaction()
+                try:
+                    self.speech.speak("I'm listening.")
+                    success, query = self.speech.listen()
+                    
+                    if success:
+                        self.run_command(query)
+                    else:
+                        if query != "Timeout":
+                            self.speech.speak("I couldn't understand. Please try again.")
+                finally:
+                    self.prefetcher.end_interaction()
             
             # Prevent high CPU usage
             time.sleep(0.1)
@@ -94,31 +124,75 @@ class VoiceAssistant:
         self.speech.speak(f"{greeting} I am {config.ASSISTANT_NAME}, your personal voice assistant.")
         self.speech.speak("How may I help you today?")
     
+    def handle_command(self, query):
+        """Process a command while keeping background prefetching out of the way"""
+        self.prefetcher.begin_interaction()
+        try:
+            self.run_command(query)
+        finally:
+            self.prefetcher.end_interaction()
+    
+    def run_command(self, query):
+        """Process a command, under the profiler in --profile mode"""
+        if not self.profiler:
+            self.process_command(query)
+            return
+        with self.profiler.profile(command_label(query)):
+            self.process_command(query)
+    
     def process_command(self, query):
         """Process user commands"""
         # Store in memory
         response = ""
+        sub_intents = split_query(query)
         
         # Check for custom commands first
-        custom_action = self.memory.get_custom_command(query)
-        if custom_action:
+        custom_plan = self.memory.get_custom_command(query)
+        if custom_plan:
             self.speech.speak(f"Executing custom command: {query}")
-            response = f"Executed custom command: {custom_action}"
-            # Here you could implement custom command execution
+            answers = []
+            for intent, (success, answer) in self.intents.run_in_order(custom_plan):
+                self.speech.speak(answer)
+                answers.append(answer)
+            response = "\n".join(answers)
+            
+        # Create a custom command
+        elif 'create a command' in query or 'new custom command' in query or 'create a custom command' in query:
+            self.speech.speak("What phrase should trigger the command?")
+            success, command = self.speech.listen()
+            if not success:
+                self.speech.speak("Sorry, I couldn't understand the phrase.")
+                response = "Failed to get custom command phrase"
+                return
+            
+            self.speech.speak("What should it do? For example: weather, news and today's reminders.")
+            success, action = self.speech.listen()
+            if not success:
+                self.speech.speak("Sorry, I couldn't understand the steps.")
+                response = "Failed to get custom command steps"
+                return
+            
+            success, message = self.memory.add_custom_command(command, action)
+            self.speech.speak(message)
+            response = message
+            
+        # Compound requests run their provider calls in parallel
+        elif len(sub_intents) > 1:
+            answers = []
+            for intent, (success, answer) in self.intents.run_in_order(sub_intents):
+                self.speech.speak(answer)
+                answers.append(answer)
+            response = "\n".join(answers)
             
         # Wikipedia search
         elif 'wikipedia' in query:
-            self.speech.speak('Searching Wikipedia...')
-            query = query.replace("wikipedia", "")
-            try:
-                results = wikipedia.summary(query.strip(), sentences=2)
+            self.speech.chatter('Searching Wikipedia...')
+            topic = parse_intent(query).argument
+            success, results = self.intents.run(Intent("wikipedia", topic))
+            if success:
                 self.speech.speak("According to Wikipedia")
-                print(results)
-                self.speech.speak(results)
-                response = results
-            except Exception as e:
-                response = f"Error searching Wikipedia: {str(e)}"
-                self.speech.speak(response)
+            self.speech.speak(results)
+            response = results
         
         # Website opening commands
         elif 'open youtube' in query:
@@ -150,25 +224,44 @@ class VoiceAssistant:
         # Application commands
         elif 'open code' in query or 'open visual studio code' in query:
             self.speech.speak("Opening Visual Studio Code")
-            success = open_application(config.VS_CODE_PATH)
+            if os.path.exists(config.VS_CODE_PATH):
+                success = open_application(config.VS_CODE_PATH)
+            else:
+                success = self.apps.launch("code")
             response = "Opened Visual Studio Code" if success else "Failed to open VS Code"
             
+        elif query.startswith('open '):
+            app_name = query[len('open '):].strip()
+            if self.apps.launch(app_name):
+                self.speech.speak(f"Opening {app_name}")
+                response = f"Opened {app_name}"
+            else:
+                self.speech.speak(f"I couldn't find an application called {app_name}")
+                response = f"Application not found: {app_name}"
+            
         # Music commands
-        elif 'play music' in query or 'play a song' in query:
+        elif 'play music' in query or 'play a song' in query or query.startswith('play '):
             try:
-                if 'play music' in query and len(query.split()) > 2:
-                    song = query.replace('play music', '').strip()
+                song = re.sub(r"^play( music| a song)?\b|\b(on|from) youtube$", "", query).strip()
+                self.music.refresh_if_stale()
+                track = self.music.find(song) if song and 'youtube' not in query else None
+                
+                if track:
+                    open_file(track["path"])
+                    self.speech.speak(f"Playing {track['title']}")
+                    response = f"Playing {track['title']}"
+                elif song:
                     self.speech.speak(f"Playing {song} on YouTube")
                     pywhatkit.playonyt(song)
                     response = f"Playing {song} on YouTube"
                 else:
                     music_dir = config.MUSIC_DIR
                     if os.path.exists(music_dir) and os.path.isdir(music_dir):
-                        songs = os.listdir(music_dir)
-                        if songs:
-                            os.startfile(os.path.join(music_dir, songs[0]))
-                            self.speech.speak(f"Playing {songs[0]}")
-                            response = f"Playing {songs[0]}"
+                        if self.music.tracks:
+                            track = self.music.tracks[0]
+                            open_file(track["path"])
+                            self.speech.speak(f"Playing {track['title']}")
+                            response = f"Playing {track['title']}"
                         else:
                             self.speech.speak("No music files found")
                             response = "No music files found"
@@ -189,6 +282,15 @@ class VoiceAssistant:
                 # Try to get contact from memory
                 email_addr = self.memory.get_contact(recipient)
                 
+                if not email_addr:
+                    # The recognizer may have misspelled a known name; a guess needs a yes from the user
+                    suggestion = self.memory.suggest_contact(recipient)
+                    if suggestion:
+                        self.speech.speak(f"Did you mean {suggestion[0]}?")
+                        success, answer = self.speech.listen()
+                        if success and re.search(r"\b(yes|yeah|yep|correct|right|sure)\b", answer.lower()):
+                            recipient, email_addr = suggestion
+                
                 if not email_addr:
                     self.speech.speak(f"I don't have {recipient}'s email address. Please provide it.")
                     success, email_addr = self.speech.listen()
@@ -214,7 +316,9 @@ class VoiceAssistant:
                     return
                 
                 # Send email
-                success, message = self.email.send_email(email_addr, subject, content)
+                success, message = self.intents.run_call(
+                    "email", lambda: self.email.send_email(email_addr, subject, content),
+                    timeout_reply=config.EMAIL_TIMEOUT_REPLY)
                 self.speech.speak(message)
                 response = message
                 
@@ -228,12 +332,12 @@ class VoiceAssistant:
         # Weather command
         elif 'weather' in query:
             # Extract city
-            city = "New York"  # Default
+            city = config.DEFAULT_CITY
             if 'in' in query:
                 city = query.split('in')[1].strip()
             
-            self.speech.speak(f"Getting weather for {city}")
-            success, weather_info = self.apis.get_weather(city)
+            self.speech.chatter(f"Getting weather for {city}")
+            success, weather_info = self.intents.run(Intent("weather", city))
             self.speech.speak(weather_info)
             response = weather_info
             
@@ -247,15 +351,16 @@ class VoiceAssistant:
             elif 'science' in query: category = "science"
             elif 'health' in query: category = "health"
             
-            self.speech.speak(f"Getting {category} news")
-            success, news_info = self.apis.get_news(category)
+            if not self.apis.news.is_fresh(category):
+                self.speech.chatter(f"Getting {category} news")
+            success, news_info = self.intents.run(Intent("news", category))
             self.speech.speak(news_info)
             response = news_info
             
         # Joke command
         elif 'joke' in query or 'tell me a joke' in query:
             self.speech.speak("Here's a joke for you")
-            success, joke = self.apis.get_joke()
+            success, joke = self.intents.run(Intent("joke"))
             self.speech.speak(joke)
             response = joke
             
@@ -350,15 +455,19 @@ class VoiceAssistant:
             self.is_running = False
             self.is_listening_for_wake_word = False
             self.reminders.stop()
+            self.prefetcher.stop()
             sys.exit()
         
         # If none of the specific commands matched, use Llama 3
         else:
-            self.speech.speak("Let me think about that...")
-            success, answer = self.apis.ask_chatgpt(query)
+            self.speech.chatter("Let me think about that...")
+            success, answer = self.intents.run(Intent("llm", query))
             if success:
                 self.speech.speak(answer)
                 response = answer
+            elif answer == config.COMMAND_TIMEOUT_REPLY:
+                self.speech.speak(answer)
+                response = "Llama 3 ran out of time"
             else:
                 self.speech.speak("I'm sorry, I couldn't find an answer to that.")
                 response = "Failed to get response from Llama 3"
@@ -373,10 +482,20 @@ if __name__ == "__main__":
     if not os.path.exists('.env'):
         print("Warning: .env file not found. See .env.example for required environment variables.")
     
-    assistant = VoiceAssistant()
+    parser = argparse.ArgumentParser(description=f"{config.ASSISTANT_NAME} voice assistant")
+    parser.add_argument("--hotword", action="store_true", help=f"Wait for '{config.WAKE_WORD}' before each command")
+    parser.add_argument("--profile", nargs="?", const=config.PROFILE_DIR, metavar="DIR",
+                        help="Write per-intent collapsed stacks to DIR")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Also log the top allocation changes between commands (uses tracemalloc)")
+    args = parser.parse_args()
+    
+    profiler = None
+    if args.profile or args.profile_memory:
+        profiler = CommandProfiler(args.profile, trace_memory=args.profile_memory or None)
+    assistant = VoiceAssistant(profiler)
     
-    # Check command line arguments for hotword activation
-    if len(sys.argv) > 1 and sys.argv[1] == "--hotword":
+    if args.hotword:
         assistant.start_with_hotword()
     else:
         assistant.start()
@@ -5,7 +5,26 @@ import requests
 import json
 from typing import Dict, List, Any, Optional, Tuple
 import config
+from cache import ResponseCache
+from deadlines import request_timeout
+from jokes import JokePool
 from llm_service import LlamaService
+from news_snapshot import NewsSnapshot
+from throttle import RateLimitedError, SingleFlight, TokenBucket
+from wikipedia_client import WikipediaClient
+
+def weather_cache_key(city: str) -> str:
+    """Cache key for a city's weather report"""
+    return f"weather:{city.strip().lower()}"
+
+def flight_key(cache_key: str, background: bool) -> str:
+    """
+    Key under which identical requests in flight are merged
+
+    Background requests give up earlier on the rate limit than user
+    requests, so the two never share a result.
+    """
+    return f"{cache_key}:background" if background else cache_key
 
 class APIServices:
     def __init__(self):
@@ -13,13 +32,94 @@ class APIServices:
         self.llm = LlamaService()
         self.weather_api_key = config.WEATHER_API_KEY
         self.news_api_key = config.NEWS_API_KEY
+        # Shared session keeps connections alive between requests
+        self.session = requests.Session()
+        self.cache = ResponseCache()
+        # Identical concurrent requests share one call; each provider keeps to its quota
+        self.flights = SingleFlight()
+        self.limiters = {
+            provider: TokenBucket(limit["rate"], limit["burst"], limit["quota"], limit["period"])
+            for provider, limit in config.RATE_LIMITS.items()
+        }
+        self.wikipedia = WikipediaClient(self.session)
+        self.news = NewsSnapshot(lambda url, headers, background: self._request("news", url, background, headers),
+                                 self.news_api_key)
+        self.jokes = JokePool(lambda url: self._request("joke", url, background=True))
+        self.jokes.start()
         
-    def get_weather(self, city: str) -> Tuple[bool, str]:
+    def warm_up(self, url: str) -> bool:
+        """
+        Open a pooled connection to a host so the next real request skips DNS and TLS setup
+        
+        Args:
+            url: Any URL on the host to warm up
+            
+        Returns:
+            bool: True if the host answered
+        """
+        try:
+            self.session.head(url, timeout=5)
+            return True
+        except Exception as e:
+            print(f"Error warming up {url}: {e}")
+            return False
+    
+    def _request(self, provider: str, url: str, background: bool = False,
+                 headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        Send a GET request within the provider's rate limit
+        
+        Args:
+            provider: Key in config.RATE_LIMITS
+            url: The URL to fetch
+            background: Don't queue, and leave part of the quota for user requests
+            headers: Extra request headers
+            
+        Raises:
+            RateLimitedError: If the rate limit or quota leaves no room for the request
+        """
+        limiter = self.limiters[provider]
+        if background:
+            reserve = int((limiter.quota or 0) * config.RATE_LIMIT_BACKGROUND_RESERVE)
+            allowed = limiter.acquire(reserve=reserve)
+        else:
+            allowed = limiter.acquire(timeout=request_timeout(config.RATE_LIMIT_MAX_WAIT))
+        if not allowed:
+            raise RateLimitedError(provider, limiter.retry_after())
+        return self.session.get(url, headers=headers, timeout=request_timeout(config.HTTP_TIMEOUT))
+    
+    def _rate_limited(self, cache_key: str, error: RateLimitedError) -> Tuple[bool, str]:
+        """Fall back to an expired cached answer when a provider is rate limited"""
+        stale = self.cache.get_stale(cache_key)
+        if stale:
+            print(f"{error}; using an earlier result")
+            return True, stale
+        return False, f"That service is busy right now, please try again in {max(1, round(error.retry_after))} seconds."
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get rate limiting and request coalescing metrics
+        
+        Returns:
+            Dict with the remaining tokens and quota of each provider, the
+            number of requests that were merged into one already in flight and
+            the LLM request queue's statistics
+        """
+        return {
+            "providers": {provider: limiter.metrics() for provider, limiter in self.limiters.items()},
+            "coalesced": self.flights.coalesced,
+            "in_flight": self.flights.in_flight(),
+            "llm": self.llm.scheduler.metrics(),
+        }
+        
+    def get_weather(self, city: str, refresh: bool = False, background: bool = False) -> Tuple[bool, str]:
         """
         Get current weather for a city
         
         Args:
             city: The city to get weather for
+            refresh: Skip the cache and fetch a new report
+            background: The request isn't for the user (e.g. prefetching)
             
         Returns:
             Tuple[bool, str]: Success status and weather information or error message
@@ -27,9 +127,18 @@ class APIServices:
         if not self.weather_api_key:
             return False, "Weather API key not configured"
         
+        cache_key = weather_cache_key(city)
+        cached = None if refresh else self.cache.get(cache_key)
+        if cached:
+            return True, cached
+        return self.flights.do(flight_key(cache_key, background),
+                               lambda: self._fetch_weather(city, cache_key, background))
+    
+    def _fetch_weather(self, city: str, cache_key: str, background: bool) -> Tuple[bool, str]:
+        """Fetch a weather report from OpenWeatherMap and cache it"""
         try:
             url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={self.weather_api_key}&units=metric"
-            response = requests.get(url)
+            response = self._request("weather", url, background)
             data = response.json()
             
             if response.status_code != 200:
@@ -46,17 +155,23 @@ class APIServices:
                 f"and wind speed is {wind_speed} meters per second."
             )
             
+            self.cache.set(cache_key, weather_info, config.WEATHER_CACHE_TTL)
             return True, weather_info
+        except RateLimitedError as e:
+            return self._rate_limited(cache_key, e)
         except Exception as e:
             return False, f"Error fetching weather data: {str(e)}"
     
-    def get_news(self, category: str = "general", count: int = 5) -> Tuple[bool, str]:
+    def get_news(self, category: str = "general", count: int = 5, refresh: bool = False,
+                 background: bool = False) -> Tuple[bool, str]:
         """
         Get latest news headlines
         
         Args:
             category: News category (general, business, entertainment, health, science, sports, technology)
             count: Number of headlines to retrieve
+            refresh: Fetch new headlines even if the snapshot is fresh
+            background: The request isn't for the user (e.g. prefetching)
             
         Returns:
             Tuple[bool, str]: Success status and news headlines or error message
@@ -64,74 +179,76 @@ class APIServices:
         if not self.news_api_key:
             return False, "News API key not configured"
         
-        try:
-            url = f"https://newsapi.org/v2/top-headlines?country=us&category={category}&apiKey={self.news_api_key}"
-            response = requests.get(url)
-            data = response.json()
-            
-            if response.status_code != 200 or data.get("status") != "ok":
-                return False, f"Error: {data.get('message', 'Unknown error')}"
-                
-            articles = data.get("articles", [])
-            if not articles:
-                return False, f"No news found for category: {category}"
-                
-            news_text = f"Here are the top {min(count, len(articles))} {category} news headlines:\n"
-            
-            for i, article in enumerate(articles[:count]):
-                news_text += f"{i+1}. {article['title']}\n"
-                
-            return True, news_text
-        except Exception as e:
-            return False, f"Error fetching news data: {str(e)}"
+        if refresh or not self.news.is_fresh(category):
+            try:
+                success, error = self.flights.do(flight_key(f"news:{category}", background),
+                                                 lambda: self.news.refresh_category(category, background))
+            except RateLimitedError as e:
+                success, error = False, f"That service is busy right now, please try again in {max(1, round(e.retry_after))} seconds."
+            except Exception as e:
+                success, error = False, f"Error fetching news data: {str(e)}"
+            if not success:
+                # Older headlines beat no headlines
+                stale = self.news.summary(category, count)
+                if stale:
+                    print(f"{error}; using earlier headlines")
+                    return True, stale
+                return False, error
+        
+        summary = self.news.summary(category, count)
+        if not summary:
+            return False, f"No news found for category: {category}"
+        return True, summary
     
     def get_joke(self) -> Tuple[bool, str]:
         """
-        Get a random joke
+        Get a random joke from the local pool, which refills itself in the background
         
         Returns:
             Tuple[bool, str]: Success status and joke or error message
         """
-        try:
-            url = "https://official-joke-api.appspot.com/random_joke"
-            response = requests.get(url)
-            data = response.json()
-            
-            if response.status_code != 200:
-                return False, "Error fetching joke"
-                
-            setup = data.get("setup", "")
-            punchline = data.get("punchline", "")
+        joke = self.jokes.tell()
+        if joke is None:
+            return False, "I can't think of a joke right now, ask me again later."
+        return True, joke
+    
+    def get_wikipedia_summary(self, query: str, sentences: int = 2) -> Tuple[bool, str]:
+        """
+        Get a short Wikipedia summary
+        
+        Args:
+            query: What to look up
+            sentences: Number of sentences to return
             
-            if not setup or not punchline:
-                return False, "Invalid joke format received"
-                
-            joke = f"{setup} ... {punchline}"
-            return True, joke
-        except Exception as e:
-            return False, f"Error fetching joke: {str(e)}"
+        Returns:
+            Tuple[bool, str]: Success status and summary or error message
+        """
+        return self.wikipedia.summary(query, sentences)
     
-    def ask_chatgpt(self, query: str) -> Tuple[bool, str]:
+    def ask_chatgpt(self, query: str, intent: str = "llm") -> Tuple[bool, str]:
         """
         Ask a question to Llama 3 (using Together AI)
         
         Args:
             query: The question to ask
+            intent: Intent asking, which sets how long the spoken answer may be
+                (config.SPOKEN_ANSWER_SECONDS)
             
         Returns:
             Tuple[bool, str]: Success status and answer or error message
         """
-        if not config.TOGETHER_API_KEY:
-            return False, "Together AI API key not configured"
+        if not self.llm.backend.is_configured():
+            return False, "LLM backend not configured. Set TOGETHER_API_KEY or LLM_BACKEND in .env file."
         
         try:
-            # Use our LlamaService to get a response
-            answer = self.llm.get_response(query)
-            
-            # Ensure the answer isn't too long for speech
-            if len(answer) > 500:
-                answer = answer[:497] + "..."
-                
+            # Size the answer to be spoken, instead of generating a long one and cutting it off
+            seconds = config.SPOKEN_ANSWER_SECONDS.get(intent, config.DEFAULT_SPOKEN_ANSWER_SECONDS)
+            answer = self.llm.get_response(query, speaking_seconds=seconds)
+            if answer == config.LLM_FALLBACK_REPLY:
+                # The circuit breaker is open
+                return False, answer
             return True, answer
+        except TimeoutError:
+            return False, config.COMMAND_TIMEOUT_REPLY
         except Exception as e:
             return False, f"Error with Llama 3: {str(e)}"
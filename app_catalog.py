@@ -0,0 +1,247 @@
+"""
+Cached application catalog for the voice assistant
+
+Applications are collected from executables on $PATH and from XDG .desktop
+files, cached to disk per directory and refreshed only for directories
+whose modification time changed. "open <app>" then becomes a dictionary
+lookup instead of a filesystem scan. Desktop applications can also be found
+by a partial or misheard name. Executables on $PATH can be opened only by
+their exact name, and only if they are on config.APP_PATH_ALLOWLIST or a
+.desktop entry runs them, so the assistant never starts commands such as
+reboot or rm.
+"""
+import difflib
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+import config
+from utils import save_to_json, load_from_json
+
+# Exec field codes from the Desktop Entry spec that we don't fill in
+_FIELD_CODES = re.compile(r"\s*%[fFuUdDnNickvm]")
+# Launchers in Exec lines that say nothing about which program a desktop entry runs
+_WRAPPERS = {"env", "sh", "bash"}
+
+def path_dirs() -> List[str]:
+    """Directories on $PATH"""
+    return [d for d in os.environ.get("PATH", "").split(os.pathsep) if d]
+
+def desktop_dirs() -> List[str]:
+    """XDG application directories, most specific first"""
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    return [os.path.join(d, "applications") for d in [data_home] + data_dirs.split(":") if d]
+
+def is_executable(path: str) -> bool:
+    """Check whether a file on $PATH can be run"""
+    if sys.platform == "win32":
+        extensions = os.environ.get("PATHEXT", ".EXE;.BAT;.CMD").lower().split(";")
+        return os.path.splitext(path)[1].lower() in extensions
+    return os.access(path, os.X_OK)
+
+def parse_desktop_file(path: str) -> Optional[Dict]:
+    """
+    Parse the [Desktop Entry] group of a .desktop file
+
+    Returns:
+        Dict with name and command, or None if the entry isn't a launchable application
+    """
+    entry = {}
+    in_entry = False
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                    continue
+                if in_entry and "=" in line:
+                    key, value = line.split("=", 1)
+                    entry.setdefault(key.strip(), value.strip())
+    except OSError:
+        return None
+
+    if entry.get("Type", "Application") != "Application" or "Exec" not in entry:
+        return None
+    if entry.get("NoDisplay") == "true" or entry.get("Hidden") == "true":
+        return None
+    # Terminal programs would start detached with no window to show them
+    if entry.get("Terminal") == "true":
+        return None
+    try:
+        command = shlex.split(_FIELD_CODES.sub("", entry["Exec"]))
+    except ValueError:
+        return None
+    if not command:
+        return None
+    return {"name": entry.get("Name", ""), "command": command}
+
+def normalize_name(name: str) -> str:
+    """Normalize an application name for lookup"""
+    name = re.sub(r"\.(desktop|exe|bat|cmd)$", "", name.lower())
+    return " ".join(re.sub(r"[^\w]+", " ", name).split())
+
+class ApplicationCatalog:
+    def __init__(self, catalog_file: Optional[str] = None):
+        """
+        Initialize the application catalog
+
+        Args:
+            catalog_file: Where the cached catalog is stored
+        """
+        self.catalog_file = catalog_file or config.APP_CATALOG_FILE
+        self.catalog = load_from_json(self.catalog_file) or {"dirs": {}}
+        self.apps: Dict[str, List[str]] = {}
+        # Names that may be matched by prefix or fuzzily: desktop applications only
+        self.desktop_names: List[str] = []
+        self.last_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+        self._build_lookup()
+
+    def refresh(self) -> int:
+        """
+        Bring the catalog up to date, rescanning only directories whose mtime changed
+
+        Returns:
+            int: Number of directories that were rescanned
+        """
+        with self._refresh_lock:
+            old_dirs = self.catalog["dirs"]
+            new_dirs = {}
+            rescanned = 0
+
+            sources = [(d, "desktop") for d in desktop_dirs()] + [(d, "path") for d in path_dirs()]
+            stack = list(reversed(sources))
+            while stack:
+                path, kind = stack.pop()
+                if path in new_dirs:
+                    continue
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+
+                entry = old_dirs.get(path)
+                if entry is None or entry["mtime"] != mtime or entry["kind"] != kind:
+                    entry = self._scan_dir(path, kind, mtime)
+                    rescanned += 1
+
+                new_dirs[path] = entry
+                # Desktop files may live in vendor subdirectories
+                stack.extend((os.path.join(path, name), kind) for name in reversed(entry["subdirs"]))
+
+            changed = rescanned > 0 or list(new_dirs) != list(old_dirs)
+            self.catalog = {"dirs": new_dirs}
+            self.last_refresh = time.monotonic()
+            if changed:
+                save_to_json(self.catalog, self.catalog_file)
+                self._build_lookup()
+            return rescanned
+
+    def refresh_if_stale(self) -> int:
+        """Refresh the catalog if the last refresh is older than the rescan interval"""
+        if time.monotonic() - self.last_refresh < config.APP_RESCAN_INTERVAL:
+            return 0
+        return self.refresh()
+
+    def _scan_dir(self, path: str, kind: str, mtime: float) -> Dict:
+        """List the applications in one directory"""
+        apps = []
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if kind == "desktop":
+                        if entry.is_dir():
+                            subdirs.append(entry.name)
+                        elif entry.name.endswith(".desktop"):
+                            desktop = parse_desktop_file(entry.path)
+                            if desktop:
+                                apps.append([desktop["name"], desktop["command"]])
+                                # Also findable by file id, e.g. "firefox" for firefox.desktop
+                                apps.append([entry.name, desktop["command"]])
+                    elif entry.is_file() and is_executable(entry.path):
+                        apps.append([entry.name, [entry.path]])
+        except OSError as e:
+            print(f"Error scanning application directory {path}: {e}")
+        return {"mtime": mtime, "kind": kind, "apps": apps, "subdirs": sorted(subdirs)}
+
+    def _build_lookup(self) -> None:
+        """Build the name to command lookup; earlier directories win"""
+        # Executables on $PATH that can be opened: allow-listed, or run by a desktop entry
+        launchable = {normalize_name(name) for name in config.APP_PATH_ALLOWLIST}
+        for entry in self.catalog["dirs"].values():
+            if entry["kind"] == "desktop":
+                launchable.update(normalize_name(os.path.basename(command[0])) for _, command in entry["apps"])
+        launchable -= _WRAPPERS
+
+        apps: Dict[str, List[str]] = {}
+        desktop_names = set()
+        for entry in self.catalog["dirs"].values():
+            for name, command in entry["apps"]:
+                name = normalize_name(name)
+                if entry["kind"] == "path" and name not in launchable:
+                    continue
+                if name not in apps and entry["kind"] == "desktop":
+                    desktop_names.add(name)
+                apps.setdefault(name, command)
+        apps.pop("", None)
+        desktop_names.discard("")
+        self.desktop_names = sorted(desktop_names)
+        self.apps = apps
+
+    def find(self, name: str) -> Optional[List[str]]:
+        """
+        Find the command that launches an application
+
+        Args:
+            name: Spoken application name, e.g. "firefox" or "text editor"
+
+        Returns:
+            The command as an argument list, or None if nothing matches.
+            Executables on $PATH match only by their exact name, and only
+            when allow-listed or run by a desktop entry.
+        """
+        apps, desktop_names = self.apps, self.desktop_names
+        name = normalize_name(name)
+        if not name:
+            return None
+        if name in apps:
+            return apps[name]
+
+        # "open visual studio" should find "visual studio code"
+        prefixed = [n for n in desktop_names if n.startswith(name + " ")]
+        if prefixed:
+            return apps[prefixed[0]]
+
+        close = difflib.get_close_matches(name, desktop_names, n=1, cutoff=0.75)
+        return apps[close[0]] if close else None
+
+    def launch(self, name: str) -> bool:
+        """
+        Launch an application by name without waiting for it
+
+        Returns:
+            bool: True if the application was started
+        """
+        self.refresh_if_stale()
+        command = self.find(name)
+        if not command:
+            return False
+        try:
+            kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+            if sys.platform == "win32":
+                kwargs["creationflags"] = subprocess.DETACHED_PROCESS
+            else:
+                # Detach so the app outlives the assistant and never blocks the voice loop
+                kwargs["start_new_session"] = True
+            subprocess.Popen(command, **kwargs)
+            return True
+        except Exception as e:
+            print(f"Error launching {name}: {e}")
+            return False
@@ -0,0 +1,183 @@
+"""
+Recorded audio sources for exercising the speech pipeline without a microphone
+
+PCMSource and WavFileSource behave like speech_recognition's Microphone:
+SpeechEngine can read from them at real-time or accelerated speed, so
+recognition, endpointing and wake-word changes can be measured on a
+corpus of recorded commands.
+"""
+import time
+import wave
+from typing import Optional
+import speech_recognition as sr
+
+class _PCMStream:
+    """File-like stream returning CHUNK frames per read, paced like a live microphone"""
+
+    def __init__(self, source: "PCMSource"):
+        self.source = source
+        self.position = 0  # in bytes
+
+    def read(self, frames: int) -> bytes:
+        source = self.source
+        size = frames * source.SAMPLE_WIDTH
+        if source.started_at is None:
+            source.started_at = time.perf_counter()
+
+        chunk = source.pcm[self.position:self.position + size]
+        self.position += size
+        if source.speed > 0:
+            # Don't hand out audio before it would have been spoken
+            due = source.started_at + self.position / source.bytes_per_second / source.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return chunk
+
+    def close(self) -> None:
+        pass
+
+class PCMSource(sr.AudioSource):
+    def __init__(self, pcm: bytes, sample_rate: int = 16000, sample_width: int = 2, chunk_size: int = 1024,
+                 speed: float = 1.0, lead_silence: float = 0.0, tail_silence: float = 2.0):
+        """
+        Initialize an in-memory mono PCM source
+
+        Args:
+            pcm: Signed little-endian mono PCM data
+            sample_rate: Samples per second
+            sample_width: Bytes per sample
+            chunk_size: Frames returned per read, like Microphone's chunk_size
+            speed: 1.0 plays in real time, 4.0 four times faster, 0 as fast as possible
+            lead_silence: Seconds of silence played first (listen() calibrates on it)
+            tail_silence: Seconds of silence after the recording, like a quiet room
+        """
+        self.SAMPLE_RATE = sample_rate
+        self.SAMPLE_WIDTH = sample_width
+        self.CHUNK = chunk_size
+        self.speed = speed
+        self.bytes_per_second = sample_rate * sample_width
+        self.lead_silence = lead_silence
+        lead = bytes(int(lead_silence * sample_rate) * sample_width)
+        tail = bytes(int(tail_silence * sample_rate) * sample_width)
+        self.pcm = lead + pcm + tail
+        self.stream = None
+        self.started_at: Optional[float] = None
+
+    def __enter__(self):
+        self.stream = _PCMStream(self)
+        self.started_at = None
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+
+    def wall_time_at(self, offset_seconds: float) -> float:
+        """
+        Wall-clock time (time.perf_counter) at which a point of the recording was played
+
+        Args:
+            offset_seconds: Position in the recording, including lead silence
+        """
+        if self.speed <= 0:
+            return time.perf_counter()
+        return (self.started_at or time.perf_counter()) + offset_seconds / self.speed
+
+class WavFileSource(PCMSource):
+    def __init__(self, path: str, **kwargs):
+        """
+        Initialize a source that plays a mono WAV file
+
+        Args:
+            path: Path to the WAV file
+            **kwargs: Passed on to PCMSource (chunk_size, speed, lead_silence, tail_silence)
+        """
+        with wave.open(path, "rb") as wav:
+            if wav.getnchannels() != 1:
+                raise ValueError(f"{path}: only mono recordings are supported")
+            pcm = wav.readframes(wav.getnframes())
+            super().__init__(pcm, wav.getframerate(), wav.getsampwidth(), **kwargs)
+        self.path = path
+
+if __name__ == "__main__":
+    # Benchmark: end-to-end listen latency, CPU and memory over a corpus of recorded commands
+    import argparse
+    import glob
+    import math
+    import os
+    import random
+    import tracemalloc
+    from array import array
+    from recognizers import FakeRecognizer, RecognizerRace
+    from speech import SpeechEngine
+    from vad import VoiceActivityDetector
+
+    parser = argparse.ArgumentParser(description="Replay recorded commands through SpeechEngine.listen")
+    parser.add_argument("corpus", nargs="?", help="Directory of mono WAV files with optional <name>.txt transcripts")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed (1 = real time)")
+    parser.add_argument("--recognizer-latency", type=float, default=0.3, help="Seconds the fake recognizer takes")
+    args = parser.parse_args()
+
+    def synthetic_corpus(count=8, rate=16000):
+        """Tone bursts standing in for spoken words"""
+        random.seed(0)
+        corpus = []
+        for i in range(count):
+            pcm = array("h")
+            for _ in range(random.randint(3, 7)):
+                pcm.extend(array("h", (int(3000 * math.sin(n / 3)) for n in range(int(0.3 * rate)))))
+                pcm.extend(array("h", (random.randint(-60, 60) for _ in range(int(random.uniform(0.1, 0.3) * rate)))))
+            corpus.append((f"synthetic-{i}", PCMSource(pcm.tobytes(), rate, speed=args.speed, lead_silence=1.0),
+                           f"command {i}"))
+        return corpus
+
+    def wav_corpus(directory):
+        corpus = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+            transcript_path = os.path.splitext(path)[0] + ".txt"
+            transcript = os.path.basename(os.path.splitext(path)[0])
+            if os.path.exists(transcript_path):
+                with open(transcript_path) as f:
+                    transcript = f.read().strip()
+            corpus.append((os.path.basename(path), WavFileSource(path, speed=args.speed, lead_silence=1.0), transcript))
+        return corpus
+
+    def speech_end(source):
+        """Offset (seconds) of the last speech frame in the source"""
+        detector = VoiceActivityDetector(300, source.SAMPLE_RATE)
+        step = source.CHUNK * source.SAMPLE_WIDTH
+        last = 0
+        for offset in range(0, len(source.pcm), step):
+            if detector.is_speech(source.pcm[offset:offset + step], source.SAMPLE_WIDTH):
+                last = offset + step
+        return last / source.bytes_per_second
+
+    corpus = wav_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    recognizer = FakeRecognizer([transcript for _, _, transcript in corpus], latency=args.recognizer_latency)
+
+    print(f"Replaying {len(corpus)} commands at {args.speed}x speed")
+    # One engine for the whole corpus, so the endpointer learns the speaker's pace
+    current = {}
+    engine = SpeechEngine(source_factory=lambda: current["source"],
+                          recognition=RecognizerRace([recognizer]), tts=False)
+    latencies = []
+    tracemalloc.start()
+    for name, source, transcript in corpus:
+        current["source"] = source
+        end = speech_end(source)
+        cpu_start = time.process_time()
+        success, text = engine.listen(timeout=5, retries=0)
+        returned_at = time.perf_counter()
+        cpu = time.process_time() - cpu_start
+
+        # Time from the user finishing the command until listen() returned
+        latency = returned_at - source.wall_time_at(end)
+        latencies.append(latency)
+        status = "ok" if success and text == transcript.lower() else f"MISMATCH ({text})"
+        print(f"{name}: latency {latency * 1000:.0f} ms, cpu {cpu * 1000:.0f} ms, {status}")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    print(f"Median latency {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+          f"max {latencies[-1] * 1000:.0f} ms, peak traced memory {peak / 1024:.0f} KiB")
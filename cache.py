@@ -0,0 +1,60 @@
+"""
+In-memory response cache for the voice assistant
+"""
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+class ResponseCache:
+    def __init__(self, default_ttl: float = 300):
+        """
+        Initialize the response cache
+
+        Args:
+            default_ttl: Seconds an entry stays fresh when no TTL is given
+        """
+        self.default_ttl = default_ttl
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a fresh value from the cache, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                # Kept so it can still be served stale while a provider is rate limited
+                return None
+            return value
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Get a value from the cache even if it has expired, or None if missing"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value in the cache"""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def time_to_live(self, key: str) -> float:
+        """Get the seconds left before an entry expires (0 if missing)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return 0.0
+        return max(0.0, entry[0] - time.monotonic())
+
+    def invalidate(self, key: str) -> None:
+        """Remove an entry from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._entries.clear()
@@ -26,20 +26,181 @@ EMAIL_SMTP_PORT = 587
 # File paths
 MEMORY_FILE = "memory.json"
 REMINDERS_FILE = "reminders.json"
+REMINDER_CHECK_INTERVAL = 60  # Most seconds between checks for due reminders
+REMINDER_ALL_DAY_TIME = "09:00"  # When reminders imported from all-day calendar events are due
 MUSIC_DIR = os.getenv("MUSIC_DIR", "C:\\Music")
+MUSIC_INDEX_FILE = "music_index.json"
+JOKE_POOL_FILE = "jokes.json"
 
 # Application paths
 VS_CODE_PATH = os.getenv("VS_CODE_PATH", "C:\\Users\\kunal\\AppData\\Local\\Programs\\Microsoft VS Code\\Code.exe")
+APP_CATALOG_FILE = "app_catalog.json"
+APP_RESCAN_INTERVAL = 300  # Seconds between checks for new or removed applications
+# Executables on $PATH that "open <app>" may start; others need a .desktop entry that runs them
+APP_PATH_ALLOWLIST = ["code", "firefox", "chromium", "google-chrome", "gedit", "nautilus", "vlc",
+                      "libreoffice", "notepad", "calc", "mspaint", "explorer"]
 
 # ChatGPT settings
 CHAT_MODEL = "gpt-3.5-turbo"
 MAX_TOKENS = 150
 
+# Latency budgets: seconds each command may take before the user gets a holding reply
+COMMAND_BUDGETS = {
+    "weather": 3,
+    "news": 3,
+    "joke": 3,
+    "wikipedia": 4,
+    "llm": 8,
+    "email": 10,
+}
+DEFAULT_COMMAND_BUDGET = 5
+COMMAND_BUDGET_GRACE = 0.25  # Extra wait for a handler that gave up right at its deadline
+COMMAND_TIMEOUT_REPLY = "That's taking longer than usual. Ask me again in a moment and I should have it."
+EMAIL_TIMEOUT_REPLY = "The mail server is slow. I'll keep sending the email in the background."
+LATE_RESULT_TTL = 300  # Seconds an answer that arrived too late is kept for the next ask
+LLM_LATE_REPLY_WAIT = 30  # Seconds past the deadline an LLM answer is still awaited, to keep for the next ask
+HTTP_TIMEOUT = 10  # Seconds for API requests made outside a command
+SMTP_TIMEOUT = 20  # Seconds for each SMTP step made outside a command
+MIN_REQUEST_TIMEOUT = 0.5  # Shortest timeout given to a request near its deadline
+
+# Response cache settings (seconds)
+WEATHER_CACHE_TTL = 600
+NEWS_CACHE_TTL = 3600  # Headlines change slowly and NewsAPI allows 100 requests a day
+
+# Wikipedia settings
+WIKIPEDIA_REST_URL = "https://en.wikipedia.org/api/rest_v1"
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+WIKIPEDIA_CACHE_TTL = 86400  # Seconds a resolved title and its summary are reused
+WIKIPEDIA_USER_AGENT = "VoiceAssistant/1.0 (personal voice assistant)"
+
+# News snapshot settings
+NEWS_SNAPSHOT_CATEGORIES = ["general", "technology"]  # Categories kept fresh in the background
+NEWS_SNAPSHOT_SIZE = 20  # Headlines kept per category
+NEWS_HEADLINE_COUNT = 5  # Headlines read out per request
+
+# Local joke pool
+JOKE_BATCH_URL = "https://official-joke-api.appspot.com/random_ten"
+JOKE_POOL_SIZE = 50  # Jokes a refill tops the pool up to
+JOKE_POOL_LOW_WATER = 15  # Refill in the background once fewer jokes than this are left
+JOKE_RECENT_SIZE = 200  # Told jokes remembered so they aren't repeated
+JOKE_REFILL_RETRY = 300  # Seconds to wait after a failed refill before trying again
+
+# Provider rate limits: sustained requests per second, burst size and quota per period (seconds)
+RATE_LIMITS = {
+    "weather": {"rate": 1.0, "burst": 10, "quota": 1000, "period": 86400},  # OpenWeatherMap free tier
+    "news": {"rate": 0.2, "burst": 5, "quota": 100, "period": 86400},  # NewsAPI developer plan
+    "joke": {"rate": 1.0, "burst": 5, "quota": None, "period": 86400},
+}
+RATE_LIMIT_MAX_WAIT = 2  # Seconds a user request may queue for its provider
+RATE_LIMIT_BACKGROUND_RESERVE = 0.2  # Share of each quota that background requests leave for the user
+
+# Default city for weather requests
+DEFAULT_CITY = "New York"
+
+# Idle-time prefetch settings
+PREFETCH_ENABLED = True
+PREFETCH_IDLE_SECONDS = 5  # How long the assistant must be idle before prefetching
+PREFETCH_INTERVAL = 300  # Seconds between prefetch rounds
+PREFETCH_REQUEST_BUDGET = 20  # Maximum prefetch requests per hour
+PREFETCH_WARMUP_URLS = [
+    "http://api.openweathermap.org",
+    "https://newsapi.org",
+]
+
+# Music library settings
+MUSIC_RESCAN_INTERVAL = 60  # Seconds between checks for changed music directories
+MUSIC_MATCH_THRESHOLD = 0.6  # Minimum match score to play a local song instead of YouTube
+
+# Compound request settings
+FANOUT_MAX_WORKERS = 5  # Provider calls that may run at the same time
+
+# Custom command macros
+MACRO_MAX_STEPS = 10
+
+# Speech output settings
+SPEECH_MERGE_WINDOW = 0.3  # Seconds to wait for more reminders firing together before speaking
+SPEECH_CHATTER_MAX_AGE = 1.5  # Filler older than this (seconds) is dropped instead of spoken
+BARGE_IN_ENABLED = True  # Stop long answers when the user starts talking
+BARGE_IN_MIN_CHARS = 120  # Only answers at least this long can be interrupted
+BARGE_IN_ENERGY_RATIO = 3.0  # Barge-in threshold relative to the listening threshold
+BARGE_IN_MIN_SPEECH = 0.3  # Seconds of speech needed to interrupt
+
+# Profiling (Assistant.py --profile)
+PROFILE_DIR = "profiles"  # Collapsed stacks per intent and the allocation log
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples while a command runs
+PROFILE_THREAD_PREFIXES = ("intent", "llm", "recognizer")  # Worker threads sampled with the command
+PROFILE_TRACE_MEMORY = False  # Compare tracemalloc snapshots between commands (slows allocation-heavy code)
+PROFILE_TRACEBACK_FRAMES = 1  # Frames tracemalloc keeps per allocation; more costs more
+PROFILE_TOP_ALLOCATIONS = 10  # Allocation changes logged per command
+
 # Voice recognition settings
 LANGUAGE = "en-in"
 PAUSE_THRESHOLD = 1
 
+# Speech recognition engines, all sent the same audio at once
+# ("google:<locale>" or "vosk" for offline recognition with VOSK_MODEL_PATH)
+RECOGNITION_ENGINES = ["google:en-in", "google:en-US"]
+RECOGNITION_MODE = "best"  # "first": first success wins; "best": most confident result
+RECOGNITION_ACCEPT_CONFIDENCE = 0.85  # Stop waiting for other engines once a result is this confident
+RECOGNITION_TIMEOUT = 6  # Seconds to wait for the engines
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "vosk-model-small-en-us")
+
+# Adaptive endpointing (voice activity detection)
+MAX_UTTERANCE_SECONDS = 10  # Hard cap on a single command
+WAKE_WORD_MAX_SECONDS = 3  # Hard cap when listening for the wake word
+ENDPOINT_MIN_SILENCE = 0.35  # Shortest trailing silence that ends an utterance
+ENDPOINT_PAUSE_MARGIN = 1.5  # Trailing silence = typical mid-sentence pause x margin
+ENDPOINT_PAUSE_HISTORY = 50  # Mid-sentence pauses remembered to learn the user's pace
+ENDPOINT_MIN_PAUSES = 5  # Pauses needed before the learned window replaces PAUSE_THRESHOLD
+ENDPOINT_PREROLL = 0.3  # Seconds of audio kept from before speech starts
+VAD_NOISE_RATIO = 3.0  # Speech must be this much louder than the background
+VAD_AGGRESSIVENESS = 2  # webrtcvad aggressiveness (0-3), used when webrtcvad is installed
+
 # Llama 3 settings (Together AI)
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
+TOGETHER_API_URL = "https://api.together.xyz/api/inference"  # Complete API endpoint
+TOGETHER_POOL_SIZE = 4  # Persistent connections kept open to Together AI
 LLAMA_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
 SYSTEM_PROMPT = "You are a helpful, respectful and honest assistant. Always answer as helpfully as possible, while being safe. Your answers should not include any harmful, unethical, racist, sexist, toxic, dangerous, or illegal content. Please ensure that your responses are socially unbiased and positive in nature. If a question is asked that is nonsensical, controversial, or out-of-scope for the voice assistant, explain why rather than answering the question directly."
+
+# Memory retrieval for LLM prompts
+RETRIEVAL_TOP_K = 5  # Most memory snippets considered per question
+RETRIEVAL_TOKEN_BUDGET = 300  # Most prompt tokens the snippets may take
+RETRIEVAL_MIN_SCORE = 0.1  # Minimum similarity for a snippet to be included
+LLM_HISTORY_MESSAGES = 6  # Recent chat messages sent with each question
+
+# LLM backend: "together" or "openai_compatible" (llama.cpp server, vLLM, ... on this machine)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "together")
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL", "http://localhost:8080/v1")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama-3")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY")
+LOCAL_LLM_POOL_SIZE = 4  # Persistent connections kept open to the local server
+LOCAL_LLM_BATCHING = os.getenv("LOCAL_LLM_BATCHING", "").lower() in ("1", "true", "yes")  # Server accepts a list of prompts on /v1/completions (vLLM)
+
+# LLM request scheduling for concurrent callers
+LLM_BATCH_WINDOW = 0.02  # Seconds to wait for more requests to batch with the first one
+LLM_MAX_BATCH_SIZE = 8  # Most requests sent in one batched call
+LLM_MAX_CONCURRENCY = 4  # Most backend calls in flight at once
+LLM_MAX_WAITING_CALLERS = 32  # Callers that can wait on the scheduler at once
+
+# LLM tail-latency controls
+LLM_HEDGE_PERCENTILE = 95  # Send a duplicate request once a call is slower than this percentile
+LLM_HEDGE_MIN_SAMPLES = 5  # Calls to observe before trusting the percentile
+LLM_HEDGE_DEFAULT_DELAY = 4.0  # Hedging delay (seconds) until enough calls were observed
+LLM_BREAKER_FAILURES = 3  # Consecutive failures that open the circuit breaker
+LLM_BREAKER_RESET_SECONDS = 30  # How long to fail fast before trying the backend again
+LLM_MAX_TOKENS = 1024
+LLM_MIN_TOKENS = 64  # Shortest answer allowed when little of the budget is left
+LLM_TOKENS_PER_SECOND = 30  # Rough generation speed, used to size answers to the budget
+LLM_FALLBACK_REPLY = "I'm having trouble reaching my language model right now. Please try again in a little while."
+
+# Spoken answers: LLM replies are sized to how long they take to say
+SPEECH_WORDS_PER_MINUTE = 200  # pyttsx3's default speaking rate
+LLM_TOKENS_PER_WORD = 1.3  # Rough tokens per English word
+LLM_SPOKEN_TOKEN_SLACK = 1.25  # Extra tokens so the model can finish its last sentence before the cut
+SPOKEN_ANSWER_SECONDS = {  # Target speaking time of an answer, per intent
+    "llm": 20,
+}
+DEFAULT_SPOKEN_ANSWER_SECONDS = 15
+SPOKEN_ANSWER_INSTRUCTION = ("Your answer will be read aloud. Answer in at most {words} words, in plain "
+                             "sentences without lists, headings, markdown or code.")
@@ -0,0 +1,247 @@
+"""
+Contact lookup that tolerates speech recognition spelling variants
+
+Recognizers spell the same name differently ("kunal" / "kunaal",
+"jon" / "john"). Each contact gets a precomputed Soundex key; a spoken
+name is first looked up among contacts that sound the same, then among
+contacts whose name words are within a small edit distance, found with a
+BK-tree over the words of all names. Both structures are updated as
+contacts are added, so a lookup never scans the whole contact list.
+"""
+import re
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+_SOUNDEX_CODES = {}
+for _letters, _code in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"), ("mn", "5"), ("r", "6")):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _code
+
+def normalize_name(name: str) -> str:
+    """Lower-case a name and collapse everything but letters and digits"""
+    return " ".join(re.sub(r"[^\w]+", " ", name.lower()).split())
+
+def soundex(word: str) -> str:
+    """American Soundex code of a word, e.g. "robert" -> "R163" """
+    letters = [c for c in word.lower() if c.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W don't separate letters with the same code; vowels do
+        if letter not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+def phonetic_key(name: str) -> str:
+    """Soundex key of every word in a name"""
+    return " ".join(soundex(word) for word in name.split())
+
+def _bitmasks(word: str) -> Dict[str, int]:
+    """Positions of each character in a word, one bit per position"""
+    masks: Dict[str, int] = {}
+    for i, c in enumerate(word):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+def _distance(word: str, masks: Dict[str, int], other: str) -> int:
+    """Edit distance using Myers' bit-parallel algorithm (one pass, a few int operations per character)"""
+    if not word:
+        return len(other)
+    full = (1 << len(word)) - 1
+    last = 1 << (len(word) - 1)
+    positive, negative, distance = full, 0, len(word)
+    for c in other:
+        equal = masks.get(c, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        up = negative | (~(horizontal | positive) & full)
+        down = positive & horizontal
+        if up & last:
+            distance += 1
+        elif down & last:
+            distance -= 1
+        up = ((up << 1) | 1) & full
+        down = (down << 1) & full
+        positive = down | (~(vertical | up) & full)
+        negative = up & vertical
+    return distance
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance between two strings"""
+    return _distance(a, _bitmasks(a), b)
+
+class BKTree:
+    def __init__(self):
+        """Initialize an empty BK-tree over edit distance"""
+        self.root: Optional[Tuple[str, Dict[int, tuple]]] = None
+        self.size = 0
+
+    def add(self, word: str) -> None:
+        """Add a word to the tree"""
+        if self.root is None:
+            self.root = (word, {})
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> Iterator[Tuple[str, int]]:
+        """Yield (word, distance) for every word within max_distance"""
+        if self.root is None:
+            return
+        masks = _bitmasks(word)
+        stack = [self.root]
+        while stack:
+            candidate, children = stack.pop()
+            distance = _distance(word, masks, candidate)
+            if distance <= max_distance:
+                yield candidate, distance
+            # Only subtrees at distance d from this node can hold matches (triangle inequality)
+            for d in range(max(1, distance - max_distance), distance + max_distance + 1):
+                child = children.get(d)
+                if child is not None:
+                    stack.append(child)
+
+class ContactIndex:
+    def __init__(self, contacts: Optional[Dict[str, str]] = None):
+        """
+        Initialize the contact index
+
+        Args:
+            contacts: Existing contacts, name to email address
+        """
+        self.emails: Dict[str, str] = {}
+        self.phonetic: Dict[str, Set[str]] = {}
+        # Contacts share first and last names, so the tree holds words rather than whole names
+        self.words: Dict[str, Set[str]] = {}
+        self.tree = BKTree()
+        for name, email in (contacts or {}).items():
+            self.add(name, email)
+
+    def add(self, name: str, email: str) -> None:
+        """Add a contact or change its email address (one thread at a time)"""
+        name = normalize_name(name)
+        if not name:
+            return
+        is_new = name not in self.emails
+        self.emails[name] = email
+        if not is_new:
+            return
+        # Sets are replaced rather than changed, so lookups on other threads can
+        # run while a contact is added without taking a lock
+        key = phonetic_key(name)
+        self.phonetic[key] = self.phonetic.get(key, set()) | {name}
+        for word in name.split():
+            known = word in self.words
+            self.words[word] = self.words.get(word, set()) | {name}
+            if not known:
+                self.tree.add(word)
+
+    def _closest(self, name: str, candidates: Iterable[str], limit: int) -> Optional[str]:
+        """The candidate with the smallest edit distance to name, if it is within limit"""
+        masks = _bitmasks(name)
+        best, best_distance = None, limit + 1
+        for candidate in candidates:
+            if abs(len(candidate) - len(name)) >= best_distance:
+                continue
+            distance = _distance(name, masks, candidate)
+            if distance < best_distance or (distance == best_distance and best is not None and candidate < best):
+                best, best_distance = candidate, distance
+        return best
+
+    def _sharing_words(self, name: str) -> Set[str]:
+        """Contacts whose name contains every word of a spoken name that is spelled like a stored one"""
+        matches: Optional[Set[str]] = None
+        for word in name.split():
+            if word in self.words:
+                matches = set(self.words[word]) if matches is None else matches & self.words[word]
+        return matches or set()
+
+    def _near_words(self, name: str) -> Set[str]:
+        """Contacts with a name close to every word of a spoken name"""
+        matches: Optional[Set[str]] = None
+        for word in name.split():
+            near: Set[str] = set()
+            for stored, _ in self.tree.search(word, max(1, len(word) // 4)):
+                near |= self.words[stored]
+            matches = near if matches is None else matches & near
+            if not matches:
+                return set()
+        return matches or set()
+
+    def match(self, name: str) -> Optional[str]:
+        """
+        Find the stored contact name a spoken name most likely refers to
+
+        Anything but an exact match is a guess ("tom" may be a new contact,
+        not "mom"), so callers should confirm it with the user.
+
+        Returns:
+            The contact's name, or None if no contact is close enough
+        """
+        name = normalize_name(name)
+        if not name:
+            return None
+        if name in self.emails:
+            return name
+
+        # Same sound and nearly the same spelling ("jane" isn't "john")
+        limit = max(1, len(name) // 4)
+        match = self._closest(name, self.phonetic.get(phonetic_key(name), ()), limit)
+        if match is None:
+            # Different first letter or a dropped syllable ("kathy" / "cathy"). Usually only one
+            # word is misheard, so contacts sharing the other words are tried before the tree.
+            match = (self._closest(name, self._sharing_words(name), limit)
+                     or self._closest(name, self._near_words(name), limit))
+        return match
+
+    def find(self, name: str) -> Optional[str]:
+        """Get the email address of the contact a spoken name refers to"""
+        match = self.match(name)
+        return self.emails[match] if match else None
+
+if __name__ == "__main__":
+    # Benchmark: lookups of misrecognized names among thousands of contacts
+    import random
+    import string
+    import time
+
+    random.seed(0)
+    syllables = ["ka", "ru", "na", "jo", "li", "sa", "mi", "ra", "vi", "an", "de", "to", "el", "ma", "ri", "sh", "be", "ko"]
+    first_names = sorted({"".join(random.choices(syllables, k=random.randint(2, 3))) for _ in range(400)})
+    last_names = sorted({"".join(random.choices(syllables, k=random.randint(2, 4))) for _ in range(1500)})
+    names = sorted({f"{random.choice(first_names)} {random.choice(last_names)}" for _ in range(5000)})
+
+    start = time.perf_counter()
+    index = ContactIndex()
+    for name in names:
+        index.add(name, f"{name.replace(' ', '.')}@example.com")
+    print(f"Indexed {len(names)} contacts in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def misspell(name):
+        i = random.randrange(len(name))
+        return name[:i] + random.choice(string.ascii_lowercase) + name[i + 1:]
+
+    queries = [misspell(random.choice(names)) for _ in range(2000)]
+    start = time.perf_counter()
+    found = sum(index.find(q) is not None for q in queries)
+    per_lookup = (time.perf_counter() - start) / len(queries)
+    print(f"{found}/{len(queries)} misspelled names matched, {per_lookup * 1e6:.0f} us per lookup")
+    for spoken, stored in [("kunaal", "kunal"), ("jon", "john"), ("cathy", "kathy"), ("jane", "john")]:
+        small = ContactIndex({stored: f"{stored}@example.com"})
+        print(f"{spoken!r} -> {small.match(spoken)!r}")
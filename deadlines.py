@@ -0,0 +1,61 @@
+"""
+Latency budgets for voice commands
+
+Each command runs under a Deadline. Code further down (HTTP requests,
+SMTP, the LLM) asks for the current deadline instead of using a fixed
+timeout, so a stalled provider can't keep the user waiting in silence.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import config
+
+_current: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+class Deadline:
+    def __init__(self, budget: float):
+        """
+        Initialize a deadline
+
+        Args:
+            budget: Seconds from now until the deadline
+        """
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (0 once it has passed)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """Check whether the deadline has passed"""
+        return time.monotonic() >= self.expires_at
+
+def current_deadline() -> Optional[Deadline]:
+    """Get the deadline of the command running on this thread, if any"""
+    return _current.get()
+
+@contextmanager
+def deadline_scope(deadline: Deadline) -> Iterator[Deadline]:
+    """Make a deadline current for the code run inside the with block"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+def request_timeout(default: float) -> float:
+    """
+    Timeout for a blocking call such as an HTTP request
+
+    Args:
+        default: Timeout used when no deadline is set, and the most allowed
+
+    Returns:
+        The smaller of the default and the time left before the current deadline
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return default
+    return max(config.MIN_REQUEST_TIMEOUT, min(default, deadline.remaining()))
@@ -6,6 +6,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Tuple
 import config
+from deadlines import request_timeout
 
 class EmailService:
     def __init__(self):
@@ -38,7 +39,8 @@ class EmailService:
             
             msg.attach(MIMEText(body, 'plain'))
             
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            # Applies to every step (connect, TLS, login, send), capped by the command's deadline
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=request_timeout(config.SMTP_TIMEOUT))
             server.ehlo()
             server.starttls()
             server.login(self.email_user, self.email_password)
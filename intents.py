@@ -0,0 +1,350 @@
+"""
+Intent parsing and parallel execution for the voice assistant
+
+A compound request such as "weather in Pune and the tech news" is split
+into sub-intents whose provider calls run concurrently on a thread pool.
+Answers are still returned in the order the user asked for them.
+"""
+import datetime
+import re
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+import config
+from cache import ResponseCache
+from deadlines import Deadline, deadline_scope
+from utils import get_current_time, get_current_date
+
+class Intent(NamedTuple):
+    name: str
+    argument: str = ""
+
+# Spoken category words mapped to NewsAPI categories
+NEWS_CATEGORIES = {
+    "business": "business",
+    "technology": "technology",
+    "tech": "technology",
+    "entertainment": "entertainment",
+    "sports": "sports",
+    "sport": "sports",
+    "science": "science",
+    "health": "health",
+}
+
+# Free-form parts of a compound request must look like a question to go to the LLM
+_QUESTION = re.compile(r"^(what|who|whom|whose|why|how|when|where|which|is|are|can|could|does|do|explain|define|describe|tell me about)\b")
+
+# Parts starting like this belong to another command handler (reminders, memory, email, music, apps),
+# even when they mention a provider ("remind me to check the weather")
+_OTHER_COMMAND = re.compile(r"^(please\s+)?(remind|remember|forget|note|save|send|email|mail|write|call|text|play|open|launch|start|set|create|add|change|search youtube)\b")
+
+# Words that say when, not where ("the weather today and tomorrow")
+_TIME_WORDS = re.compile(r"^(today|tonight|tomorrow|now|later|this (morning|afternoon|evening|week|weekend)|next week)$")
+
+# Words that join the parts of a compound request
+_CONJUNCTIONS = re.compile(r"\s*(,|\band then\b|\band also\b|\band\b|\balso\b|\bthen\b|\bplus\b)\s*")
+
+def extract_city(text: str) -> str:
+    """Extract the city from a weather request, or an empty string for the default city"""
+    match = re.search(r".*\b(?:in|for|at)\s+(.+)$", text)
+    if not match:
+        return ""
+    return re.sub(r"^the\s+", "", match.group(1)).strip(" ?.!")
+
+def extract_news_category(text: str) -> str:
+    """Extract the news category from a request, defaulting to general news"""
+    for word, category in NEWS_CATEGORIES.items():
+        if re.search(rf"\b{word}\b", text):
+            return category
+    return "general"
+
+def parse_intent(text: str) -> Optional[Intent]:
+    """
+    Parse a single request into a provider intent
+
+    Args:
+        text: Lower-case request text
+
+    Returns:
+        The matching intent, or None if no built-in provider handles it
+    """
+    text = text.strip()
+    if 'wikipedia' in text:
+        topic = re.sub(r"\b(search|wikipedia|for|on)\b", " ", text)
+        return Intent("wikipedia", " ".join(topic.split()))
+    if 'weather' in text:
+        return Intent("weather", extract_city(text))
+    if 'news' in text or 'headlines' in text:
+        return Intent("news", extract_news_category(text))
+    if 'joke' in text:
+        return Intent("joke")
+    if re.search(r"\breminders\b", text) and not re.search(r"\b(set|add|create)\b", text):
+        return Intent("reminders", "today" if "today" in text else "")
+    if 'the time' in text or text == 'time':
+        return Intent("time")
+    if 'the date' in text or "today's date" in text or text == 'date':
+        return Intent("date")
+    return None
+
+def split_query(query: str) -> List[Intent]:
+    """
+    Split a compound request into sub-intents
+
+    Parts that don't match a built-in provider are glued back onto the
+    preceding free-form part, so "what is rock and roll" stays one
+    question. A free-form part becomes an LLM question only when at least
+    one other part matched a provider and it reads like a question;
+    otherwise the whole query is returned as a single intent so the
+    other command handlers still see it.
+
+    Args:
+        query: Lower-case request text
+
+    Returns:
+        List of intents in the order they were asked for
+    """
+    pieces = _CONJUNCTIONS.split(query.strip())
+    parts = pieces[0::2]
+    joiners = pieces[1::2]
+
+    segments: List[Tuple[Optional[Intent], str]] = []
+    for i, part in enumerate(parts):
+        part = part.strip()
+        if not part:
+            continue
+        if _OTHER_COMMAND.match(part):
+            # Only provider requests are split; the whole query goes to its command handler
+            return [parse_intent(query) or Intent("llm", query.strip())]
+        intent = parse_intent(part)
+        if intent is None and segments:
+            previous, text = segments[-1]
+            if previous is None:
+                # Continue the previous free-form question
+                segments[-1] = (None, f"{text} {joiners[i - 1]} {part}")
+                continue
+            if (previous.name == "weather" and previous.argument and len(part.split()) <= 3
+                    and not _QUESTION.match(part) and not _TIME_WORDS.match(part.strip(" ?.!"))):
+                # "weather in pune and mumbai" asks about two cities
+                intent = Intent("weather", part.strip(" ?.!"))
+        segments.append((intent, part))
+
+    if not any(intent for intent, _ in segments):
+        return [Intent("llm", query.strip())]
+    if any(intent is None and not _QUESTION.match(text) for intent, text in segments):
+        return [parse_intent(query) or Intent("llm", query.strip())]
+    return [intent or Intent("llm", text) for intent, text in segments]
+
+class IntentRunner:
+    def __init__(self, apis, reminders=None, max_workers: int = config.FANOUT_MAX_WORKERS):
+        """
+        Initialize the intent runner
+
+        Args:
+            apis: APIServices instance used to answer provider intents
+            reminders: Optional ReminderSystem used to answer reminder intents
+            max_workers: Maximum number of provider calls in flight
+        """
+        self.apis = apis
+        self.reminders = reminders
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="intent")
+        # Answers that arrived after their budget ran out, kept for the next ask
+        self.late_results = ResponseCache(config.LATE_RESULT_TTL)
+
+    def execute(self, intent: Intent) -> Tuple[bool, str]:
+        """
+        Answer a single intent
+
+        Returns:
+            Tuple[bool, str]: Success status and the answer or error message
+        """
+        if intent.name == "weather":
+            return self.apis.get_weather(intent.argument or config.DEFAULT_CITY)
+        if intent.name == "news":
+            return self.apis.get_news(intent.argument or "general")
+        if intent.name == "joke":
+            return self.apis.get_joke()
+        if intent.name == "wikipedia":
+            return self.apis.get_wikipedia_summary(intent.argument)
+        if intent.name == "llm":
+            return self.apis.ask_chatgpt(intent.argument, intent.name)
+        if intent.name == "reminders":
+            return self.list_reminders(today_only=intent.argument == "today")
+        if intent.name == "time":
+            return True, f"The current time is {get_current_time()}"
+        if intent.name == "date":
+            return True, f"Today is {get_current_date()}"
+        return False, f"Unknown intent: {intent.name}"
+
+    def _execute_by(self, intent: Intent, deadline: Deadline) -> Tuple[bool, str]:
+        """Answer an intent on a worker thread with its deadline in scope"""
+        return self._call_by(lambda: self.execute(intent), deadline)
+
+    def _call_by(self, fn: Callable[[], Tuple[bool, str]], deadline: Deadline) -> Tuple[bool, str]:
+        with deadline_scope(deadline):
+            return fn()
+
+    def run_call(self, name: str, fn: Callable[[], Tuple[bool, str]], timeout_reply: Optional[str] = None,
+                 budget: Optional[float] = None) -> Tuple[bool, str]:
+        """
+        Run a handler that isn't a parsed intent (e.g. sending an email) within its latency budget
+
+        Unlike intents, a late answer isn't kept for the next ask; the call
+        just finishes in the background.
+
+        Args:
+            name: Key in config.COMMAND_BUDGETS
+            fn: The handler, returning a success status and message
+            timeout_reply: What to tell the user if the budget runs out
+            budget: Seconds allowed; defaults to the budget for name
+
+        Returns:
+            Tuple[bool, str]: Success status and the answer or error message
+        """
+        if budget is None:
+            budget = config.COMMAND_BUDGETS.get(name, config.DEFAULT_COMMAND_BUDGET)
+        deadline = Deadline(budget)
+        future = self.executor.submit(self._call_by, fn, deadline)
+        try:
+            return future.result(timeout=deadline.remaining() + config.COMMAND_BUDGET_GRACE)
+        except FutureTimeout:
+            return False, timeout_reply or config.COMMAND_TIMEOUT_REPLY
+        except Exception as e:
+            return False, f"Error handling {name}: {str(e)}"
+
+    def submit(self, intent: Intent, budget: Optional[float] = None) -> Tuple[Future, Deadline]:
+        """
+        Start answering an intent within its latency budget
+
+        Args:
+            intent: The intent to answer
+            budget: Seconds allowed; defaults to config.COMMAND_BUDGETS for the intent
+
+        Returns:
+            The running call and its deadline, to pass to collect()
+        """
+        if budget is None:
+            budget = config.COMMAND_BUDGETS.get(intent.name, config.DEFAULT_COMMAND_BUDGET)
+        deadline = Deadline(budget)
+        key = f"{intent.name}:{intent.argument}"
+        late = self.late_results.get(key)
+        if late is not None:
+            self.late_results.invalidate(key)
+            future = Future()
+            future.set_result(late)
+            return future, deadline
+        return self.executor.submit(self._execute_by, intent, deadline), deadline
+
+    def collect(self, intent: Intent, future: Future, deadline: Deadline) -> Tuple[bool, str]:
+        """
+        Wait for an answer until its deadline, falling back to a holding reply
+
+        An answer that arrives too late is kept and given the next time
+        the same intent is asked for.
+        """
+        try:
+            success, answer = future.result(timeout=deadline.remaining() + config.COMMAND_BUDGET_GRACE)
+        except FutureTimeout:
+            key = f"{intent.name}:{intent.argument}"
+            future.add_done_callback(lambda f: self._keep_late_result(key, f))
+            return False, config.COMMAND_TIMEOUT_REPLY
+        except Exception as e:
+            return False, f"Error handling {intent.name}: {str(e)}"
+        if not success and deadline.expired():
+            # The provider call gave up at the deadline
+            return False, config.COMMAND_TIMEOUT_REPLY
+        return success, answer
+
+    def _keep_late_result(self, key: str, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        success, answer = future.result()
+        if success:
+            self.late_results.set(key, (success, answer))
+
+    def run(self, intent: Intent, budget: Optional[float] = None) -> Tuple[bool, str]:
+        """Answer one intent within its latency budget"""
+        future, deadline = self.submit(intent, budget)
+        return self.collect(intent, future, deadline)
+
+    def list_reminders(self, today_only: bool = False) -> Tuple[bool, str]:
+        """Describe the active reminders, optionally only those due today"""
+        if self.reminders is None:
+            return False, "Reminders are not available"
+        reminders = self.reminders.get_reminders()
+        if today_only:
+            today = datetime.date.today().strftime("%Y-%m-%d")
+            reminders = [r for r in reminders if r.get("due_date", "").startswith(today)]
+        if not reminders:
+            return True, "You don't have any reminders today." if today_only else "You don't have any active reminders."
+        items = ". ".join(f"{r['title']} at {r['due_date']}" for r in reminders)
+        return True, f"You have {len(reminders)} reminders: {items}"
+
+    def run_in_order(self, intents: List[Intent]) -> Iterator[Tuple[Intent, Tuple[bool, str]]]:
+        """
+        Run all intents concurrently and yield their answers in request order
+
+        The first answer is yielded as soon as it is ready, while the
+        remaining calls keep running in the background.
+        """
+        calls = [self.submit(intent) for intent in intents]
+        for intent, (future, deadline) in zip(intents, calls):
+            yield intent, self.collect(intent, future, deadline)
+
+    def run_all(self, intents: List[Intent]) -> List[Tuple[bool, str]]:
+        """Run all intents concurrently and return their answers in request order"""
+        return [result for _, result in self.run_in_order(intents)]
+
+if __name__ == "__main__":
+    # Benchmark: compound request with stubbed provider latencies
+    import time
+
+    class StubAPIs:
+        def get_weather(self, city):
+            time.sleep(0.8)
+            return True, f"Weather in {city}"
+
+        def get_news(self, category):
+            time.sleep(0.6)
+            return True, f"{category} news"
+
+        def get_joke(self):
+            time.sleep(0.3)
+            return True, "A joke"
+
+        def get_wikipedia_summary(self, query):
+            time.sleep(0.7)
+            return True, f"About {query}"
+
+        def ask_chatgpt(self, query, intent="llm"):
+            time.sleep(1.2)
+            return True, f"Answer to {query}"
+
+    # Commands for other handlers and follow-up phrases must not be split
+    for text, expected in [
+        ("weather in pune and mumbai", [Intent("weather", "pune"), Intent("weather", "mumbai")]),
+        ("remind me to check the weather then call mom", 1),
+        ("remember this the weather is nice and sunny", 1),
+        ("what is the weather like today and tomorrow", [Intent("weather", "")]),
+        ("send an email to john and tell me a joke", 1),
+        ("play some music and the news", 1),
+    ]:
+        result = split_query(text)
+        ok = len(result) == expected if isinstance(expected, int) else result == expected
+        print(f"{'ok  ' if ok else 'FAIL'} {text!r} -> {result}")
+
+    query = "weather in pune and the tech news and tell me a joke and what is a black hole"
+    intents = split_query(query)
+    runner = IntentRunner(StubAPIs())
+    print(f"Query: {query}")
+    print(f"Intents: {intents}")
+
+    start = time.perf_counter()
+    for intent in intents:
+        runner.execute(intent)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    runner.run_all(intents)
+    parallel = time.perf_counter() - start
+
+    print(f"Sequential: {sequential:.2f}s")
+    print(f"Fan-out:    {parallel:.2f}s (slowest single call 1.20s)")
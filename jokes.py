@@ -0,0 +1,200 @@
+"""
+Local joke pool for the voice assistant
+
+Jokes are kept in a pool on disk and told straight from memory. When the
+pool runs low, a background thread refills it with the joke API's batch
+endpoint, ten jokes per request. Recently told jokes are remembered so a
+refill doesn't bring them straight back. Offline, the assistant keeps
+telling jokes from the pool, and repeats the oldest ones once it is empty.
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+import requests
+import config
+from utils import save_to_json, load_from_json
+
+# Sends a GET request for background work: fetch(url) -> response
+Fetcher = Callable[[str], requests.Response]
+
+# Told when the pool has never been filled and the joke API can't be reached
+_STARTER_JOKES = [
+    {"id": "starter-1", "setup": "Why do programmers prefer dark mode?", "punchline": "Because light attracts bugs."},
+    {"id": "starter-2", "setup": "Why did the scarecrow win an award?",
+     "punchline": "Because he was outstanding in his field."},
+    {"id": "starter-3", "setup": "What do you call a fake noodle?", "punchline": "An impasta."},
+    {"id": "starter-4", "setup": "Why don't skeletons fight each other?", "punchline": "They don't have the guts."},
+    {"id": "starter-5", "setup": "How does a penguin build its house?", "punchline": "Igloos it together."},
+]
+
+def joke_text(joke: Dict[str, str]) -> str:
+    """How a joke is spoken"""
+    return f"{joke['setup']} ... {joke['punchline']}"
+
+def _joke_id(joke: Dict) -> str:
+    """Identify a joke by the API's id, or by its setup if it has none"""
+    return str(joke.get("id") or joke.get("setup", "").strip().lower())
+
+class JokePool:
+    def __init__(self, fetch: Fetcher, path: Optional[str] = None):
+        """
+        Initialize the joke pool
+
+        Args:
+            fetch: Sends a GET request within the joke API's rate limit
+            path: File the pool and the recently told jokes are kept in
+        """
+        self.fetch = fetch
+        self.path = path or config.JOKE_POOL_FILE
+        self.low_water = config.JOKE_POOL_LOW_WATER
+        self.target_size = config.JOKE_POOL_SIZE
+        self.jokes: Deque[Dict[str, str]] = deque()
+        # Told jokes, oldest first, so a refill doesn't bring them back
+        self.recent: Deque[Dict[str, str]] = deque(maxlen=config.JOKE_RECENT_SIZE)
+        self._known = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failed_at: Optional[float] = None
+        self._load()
+
+    def _load(self) -> None:
+        """Load the pool saved by an earlier session, or start from the built-in jokes"""
+        data = load_from_json(self.path) or {}
+        jokes = data.get("jokes") if isinstance(data, dict) else None
+        recent = data.get("recent") if isinstance(data, dict) else None
+        self.recent.extend(j for j in (recent or []) if self._valid(j))
+        self._known = {_joke_id(j) for j in self.recent}
+        self._add(jokes if jokes is not None else _STARTER_JOKES)
+
+    @staticmethod
+    def _valid(joke) -> bool:
+        return isinstance(joke, dict) and bool(joke.get("setup")) and bool(joke.get("punchline"))
+
+    def _add(self, jokes: List[Dict]) -> int:
+        """Add the jokes that aren't already in the pool or recently told"""
+        added = 0
+        for joke in jokes:
+            if not self._valid(joke) or _joke_id(joke) in self._known:
+                continue
+            self.jokes.append({"id": _joke_id(joke), "setup": joke["setup"].strip(),
+                               "punchline": joke["punchline"].strip()})
+            self._known.add(_joke_id(joke))
+            added += 1
+        return added
+
+    def tell(self) -> Optional[str]:
+        """
+        Take the next joke from the pool
+
+        Returns:
+            The joke to speak, or None if no joke was ever loaded
+        """
+        with self._lock:
+            if self.jokes:
+                joke = self.jokes.popleft()
+            elif self.recent:
+                # Out of new jokes and offline: the oldest told joke is the least likely to be remembered
+                joke = self.recent.popleft()
+            else:
+                return None
+            if len(self.recent) == self.recent.maxlen:
+                # Forgotten jokes may come back with a later refill
+                self._known.discard(self.recent[0]["id"])
+            self.recent.append(joke)
+            self._known.add(joke["id"])
+        # Saving and refilling happen on the background thread
+        self._wakeup.set()
+        return joke_text(joke)
+
+    def save(self) -> bool:
+        """Write the pool and the recently told jokes to disk"""
+        with self._lock:
+            data = {"jokes": list(self.jokes), "recent": list(self.recent)}
+        return save_to_json(data, self.path)
+
+    def refill(self) -> int:
+        """
+        Fetch jokes until the pool is back to its target size
+
+        Returns:
+            int: Number of new jokes added
+        """
+        added = 0
+        # A few extra rounds in case a batch is mostly jokes already known
+        for _ in range(max(1, (self.target_size - len(self.jokes)) // 10 + 2)):
+            if len(self.jokes) >= self.target_size:
+                break
+            response = self.fetch(config.JOKE_BATCH_URL)
+            response.raise_for_status()
+            batch = response.json()
+            with self._lock:
+                new = self._add(batch if isinstance(batch, list) else [])
+            added += new
+            if not new:
+                break
+        return added
+
+    def _maintain(self) -> None:
+        """Background thread that saves the pool and refills it below the low-water mark"""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Offline, don't try again on every joke
+            retry = self._failed_at is None or time.monotonic() - self._failed_at >= config.JOKE_REFILL_RETRY
+            if len(self.jokes) < self.low_water and retry:
+                try:
+                    self.refill()
+                    self._failed_at = None
+                except Exception as e:
+                    self._failed_at = time.monotonic()
+                    print(f"Error refilling jokes: {e}")
+            self.save()
+
+    def start(self) -> None:
+        """Start the background thread, refilling right away if the pool is low"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._maintain, daemon=True, name="jokes")
+            self._thread.start()
+        if len(self.jokes) < self.low_water:
+            self._wakeup.set()
+
+if __name__ == "__main__":
+    # Benchmark: telling jokes from the pool while a stand-in API refills it
+    import os
+    import tempfile
+
+    class StandInResponse:
+        def __init__(self, jokes):
+            self.jokes = jokes
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.jokes
+
+    served = []
+
+    def fetch(url):
+        time.sleep(0.2)  # A round trip to the joke API
+        start = len(served)
+        batch = [{"id": start + i, "setup": f"Setup {start + i}?", "punchline": f"Punchline {start + i}."}
+                 for i in range(10)]
+        served.extend(batch)
+        return StandInResponse(batch)
+
+    pool = JokePool(fetch, os.path.join(tempfile.mkdtemp(), "jokes.json"))
+    pool.start()
+    time.sleep(1.5)
+    print(f"Pool filled to {len(pool.jokes)} jokes with {len(served) // 10} batch requests")
+    told = []
+    start = time.perf_counter()
+    for _ in range(45):
+        told.append(pool.tell())
+    per_joke = (time.perf_counter() - start) / len(told)
+    print(f"Told {len(told)} jokes at {per_joke * 1e6:.1f} us each, {len(set(told))} different")
+    time.sleep(1.5)
+    print(f"Pool refilled in the background to {len(pool.jokes)} jokes, "
+          f"{sum(text in told for text in map(joke_text, pool.jokes))} of them already told")
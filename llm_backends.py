@@ -0,0 +1,288 @@
+"""
+LLM backends for the voice assistant
+
+Every backend takes chat messages ({"role": ..., "content": ...}) and
+returns the reply text, so LlamaService doesn't care whether the model
+runs on Together AI or on a local OpenAI-compatible server such as
+llama.cpp server or vLLM.
+"""
+from typing import Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+import config
+
+def format_llama3_prompt(messages: List[Dict[str, str]]) -> str:
+    """
+    Format chat messages with the Llama 3 instruct template
+
+    Args:
+        messages: Chat messages, starting with the system message
+
+    Returns:
+        Prompt string ending with an open assistant turn
+    """
+    prompt = "<|begin_of_text|>"
+    for message in messages:
+        prompt += f"<|start_header_id|>{message['role']}<|end_header_id|>\n\n{message['content'].strip()}<|eot_id|>"
+    return prompt + "<|start_header_id|>assistant<|end_header_id|>\n\n"
+
+class LLMBackend:
+    """Base class for LLM backends"""
+    name = "base"
+    # Whether complete_batch answers several conversations in one request
+    supports_batching = False
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def is_configured(self) -> bool:
+        """Check whether the backend has everything it needs to answer"""
+        return True
+
+    def complete(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.7,
+                 timeout: Optional[float] = None) -> str:
+        """
+        Get the model's reply to a conversation
+
+        Args:
+            messages: Chat messages, starting with the system message
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+            timeout: Seconds to wait for the reply, where the backend supports it
+
+        Returns:
+            The reply text
+        """
+        raise NotImplementedError
+
+    def complete_batch(self, conversations: List[List[Dict[str, str]]], max_tokens: int = 1024,
+                       temperature: float = 0.7, timeout: Optional[float] = None) -> List[str]:
+        """
+        Get the model's replies to several conversations
+
+        Backends without batching answer them one after another.
+
+        Returns:
+            The reply texts, in the order of the conversations
+        """
+        return [self.complete(messages, max_tokens, temperature, timeout) for messages in conversations]
+
+    def warm_up(self) -> bool:
+        """Open a connection to the backend ahead of the first real request"""
+        return False
+
+class TogetherBackend(LLMBackend):
+    """Llama 3 on Together AI through the Complete API"""
+    name = "together"
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, timeout: float = 60):
+        """
+        Initialize the Together AI backend
+
+        Args:
+            api_key: Together AI API key
+            model: Model name to request
+            timeout: Request timeout in seconds
+        """
+        super().__init__(model or config.LLAMA_MODEL)
+        self.api_key = api_key or config.TOGETHER_API_KEY
+        self.url = config.TOGETHER_API_URL
+        self.timeout = timeout
+
+        # The SDK posts without a timeout, so a stalled call would hold a scheduler slot
+        # indefinitely; post to the API directly through a pooled session instead
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.TOGETHER_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        if self.api_key:
+            self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def complete(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.7,
+                 timeout: Optional[float] = None) -> str:
+        response = self.session.post(
+            self.url,
+            json={
+                "model": self.model,
+                "prompt": format_llama3_prompt(messages),
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "top_p": 0.9,
+                "top_k": 50,
+                "stop": ["<|eot_id|>"],
+            },
+            timeout=timeout or self.timeout
+        )
+        response.raise_for_status()
+        return response.json()['output']['choices'][0]['text'].strip()
+
+    def warm_up(self) -> bool:
+        try:
+            self.session.head(self.url, timeout=5)
+            return True
+        except Exception as e:
+            print(f"Error warming up Together AI: {e}")
+            return False
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Any server exposing the OpenAI chat completions API (llama.cpp server, vLLM, ...)"""
+    name = "openai_compatible"
+
+    def __init__(self, base_url: Optional[str] = None, model: Optional[str] = None,
+                 api_key: Optional[str] = None, timeout: float = 60):
+        """
+        Initialize the OpenAI-compatible backend
+
+        Args:
+            base_url: Server URL including the /v1 prefix
+            model: Model name to request
+            api_key: Optional bearer token
+            timeout: Request timeout in seconds
+        """
+        super().__init__(model or config.LOCAL_LLM_MODEL)
+        self.base_url = (base_url or config.LOCAL_LLM_URL).rstrip("/")
+        self.timeout = timeout
+
+        # Persistent pooled session so every request reuses a warm connection
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.LOCAL_LLM_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        api_key = api_key or config.LOCAL_LLM_API_KEY
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+        self.supports_batching = config.LOCAL_LLM_BATCHING
+
+    def complete(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.7,
+                 timeout: Optional[float] = None) -> str:
+        response = self.session.post(
+            f"{self.base_url}/chat/completions",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            },
+            timeout=timeout or self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    def complete_batch(self, conversations: List[List[Dict[str, str]]], max_tokens: int = 1024,
+                       temperature: float = 0.7, timeout: Optional[float] = None) -> List[str]:
+        if not self.supports_batching:
+            return super().complete_batch(conversations, max_tokens, temperature, timeout)
+        # The chat endpoint takes one conversation; the completions endpoint takes a list of prompts
+        response = self.session.post(
+            f"{self.base_url}/completions",
+            json={
+                "model": self.model,
+                "prompt": [format_llama3_prompt(messages) for messages in conversations],
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stop": ["<|eot_id|>"],
+            },
+            timeout=timeout or self.timeout
+        )
+        response.raise_for_status()
+        replies = [""] * len(conversations)
+        for choice in response.json()["choices"]:
+            replies[choice["index"]] = choice["text"].strip()
+        return replies
+
+    def warm_up(self) -> bool:
+        try:
+            self.session.get(f"{self.base_url}/models", timeout=5)
+            return True
+        except Exception as e:
+            print(f"Error warming up LLM server at {self.base_url}: {e}")
+            return False
+
+BACKENDS = {
+    TogetherBackend.name: TogetherBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+}
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+    """
+    Create the LLM backend selected in config.LLM_BACKEND
+
+    Args:
+        name: Backend name to use instead of the configured one
+
+    Returns:
+        The backend instance
+    """
+    name = name or config.LLM_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+if __name__ == "__main__":
+    # Check OpenAICompatibleBackend against a local stand-in for an OpenAI-compatible server
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StandInServer(BaseHTTPRequestHandler):
+        """Answers /v1 requests; /error/v1 fails and /slow/v1 answers too late"""
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path.startswith("/error/"):
+                return self.reply(503, {"error": "model is loading"})
+            if self.path.startswith("/slow/"):
+                time.sleep(1)
+            if self.path.endswith("/chat/completions"):
+                text = f"reply to {body['messages'][-1]['content']}"
+                return self.reply(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]})
+            if self.path.endswith("/completions"):
+                # Choices may come back in any order; the index says which prompt each answers
+                choices = [{"index": i, "text": f" reply to prompt {i} of {len(body['prompt'])}"}
+                           for i in range(len(body["prompt"]))]
+                return self.reply(200, {"choices": list(reversed(choices))})
+            self.reply(404, {"error": "not found"})
+
+        def reply(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    question = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "hello"}]
+
+    backend = OpenAICompatibleBackend(f"{url}/v1")
+    assert backend.complete(question) == "reply to hello"
+    print("ok   /chat/completions")
+
+    backend.supports_batching = True
+    replies = backend.complete_batch([question] * 3)
+    assert replies == [f"reply to prompt {i} of 3" for i in range(3)], replies
+    print("ok   /completions batch of 3, replies matched by index")
+
+    try:
+        OpenAICompatibleBackend(f"{url}/error/v1").complete(question)
+        raise AssertionError("error status was not raised")
+    except requests.HTTPError as e:
+        assert e.response.status_code == 503
+    print("ok   error status raises HTTPError")
+
+    start = time.monotonic()
+    try:
+        OpenAICompatibleBackend(f"{url}/slow/v1").complete(question, timeout=0.2)
+        raise AssertionError("slow reply did not time out")
+    except requests.Timeout:
+        assert time.monotonic() - start < 0.9
+    print("ok   slow server times out")
+    server.shutdown()
@@ -0,0 +1,240 @@
+"""
+Request scheduling for an LLM backend shared by concurrent callers
+
+Prompts from every caller go through one queue. When the backend can
+answer several conversations in one request, prompts that arrive within
+a short window are sent together, so they share one call's overhead.
+Otherwise each prompt is sent on its own. Either way, at most a fixed
+number of calls are in flight, so a burst of callers queues here instead
+of overloading the server.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Deque, Dict, List, Optional
+import config
+from llm_backends import LLMBackend
+
+class _Request:
+    """One queued prompt and the future its caller waits on"""
+
+    def __init__(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float,
+                 timeout: Optional[float]):
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.future: Future = Future()
+        self.queued_at = time.monotonic()
+        self.expires_at = None if timeout is None else self.queued_at + timeout
+
+class LLMScheduler:
+    def __init__(self, backend: LLMBackend, batch_window: Optional[float] = None,
+                 max_batch_size: Optional[int] = None, max_concurrency: Optional[int] = None):
+        """
+        Initialize the scheduler
+
+        Args:
+            backend: Backend the requests are sent to
+            batch_window: Seconds to wait for more requests to batch with the first one
+            max_batch_size: Most requests sent in one batched call
+            max_concurrency: Most backend calls in flight at once
+        """
+        self.backend = backend
+        self.batch_window = config.LLM_BATCH_WINDOW if batch_window is None else batch_window
+        self.max_batch_size = max_batch_size or config.LLM_MAX_BATCH_SIZE
+        self.max_concurrency = max_concurrency or config.LLM_MAX_CONCURRENCY
+        self._queue: Deque[_Request] = deque()
+        self._ready = threading.Condition()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm_call")
+        self._worker: Optional[threading.Thread] = None
+        # Monitoring
+        self.requests = 0
+        self.calls = 0
+        self.expired = 0
+        self.queue_waits: Deque[float] = deque(maxlen=1000)
+
+    @property
+    def batching(self) -> bool:
+        """Whether requests are grouped into batched calls"""
+        return self.backend.supports_batching and self.max_batch_size > 1
+
+    def submit(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.7,
+               timeout: Optional[float] = None) -> Future:
+        """
+        Queue a conversation for the backend
+
+        Args:
+            messages: Chat messages, starting with the system message
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+            timeout: Seconds until the caller stops waiting; the request is dropped if it is still queued then
+
+        Returns:
+            Future resolving to the reply text
+        """
+        request = _Request(messages, max_tokens, temperature, timeout)
+        with self._ready:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True, name="llm_scheduler")
+                self._worker.start()
+            self._queue.append(request)
+            self.requests += 1
+            self._ready.notify()
+        return request.future
+
+    def complete(self, messages: List[Dict[str, str]], max_tokens: int = 1024, temperature: float = 0.7,
+                 timeout: Optional[float] = None) -> str:
+        """
+        Get the model's reply to a conversation, waiting in the queue if needed
+
+        Raises:
+            TimeoutError: If no reply arrived within the timeout
+        """
+        future = self.submit(messages, max_tokens, temperature, timeout)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise TimeoutError(f"No reply within {timeout:.1f} seconds")
+
+    def _next_batch(self) -> List[_Request]:
+        """Wait for requests and take the next group to send together"""
+        with self._ready:
+            while not self._queue:
+                self._ready.wait()
+            if self.batching:
+                # Give other callers a moment to join the first request's batch
+                send_at = self._queue[0].queued_at + self.batch_window
+                while len(self._queue) < self.max_batch_size:
+                    remaining = send_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+            limit = self.max_batch_size if self.batching else 1
+            temperature = self._queue[0].temperature
+            batch, kept = [], deque()
+            while self._queue and len(batch) < limit:
+                request = self._queue.popleft()
+                # One call has one temperature; others wait for the next batch
+                (batch if request.temperature == temperature else kept).append(request)
+            self._queue.extendleft(reversed(kept))
+            return batch
+
+    def _run(self) -> None:
+        """Worker thread that sends queued requests to the backend"""
+        while True:
+            # Wait for a free slot first, so requests arriving meanwhile can join the next batch
+            self._slots.acquire()
+            now = time.monotonic()
+            batch = []
+            for request in self._next_batch():
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+                if request.expires_at is not None and now >= request.expires_at:
+                    self.expired += 1
+                    request.future.set_exception(TimeoutError("Request expired in the queue"))
+                    continue
+                batch.append(request)
+            if not batch:
+                self._slots.release()
+                continue
+            now = time.monotonic()
+            self.queue_waits.extend(now - request.queued_at for request in batch)
+            self.calls += 1
+            self._executor.submit(self._call, batch)
+
+    def _call(self, batch: List[_Request]) -> None:
+        """Send one call and hand each caller its reply"""
+        try:
+            now = time.monotonic()
+            expiries = [r.expires_at for r in batch]
+            timeout = None if None in expiries else max(0.1, max(expiries) - now)
+            max_tokens = max(r.max_tokens for r in batch)
+            if len(batch) == 1:
+                replies = [self.backend.complete(batch[0].messages, max_tokens, batch[0].temperature, timeout)]
+            else:
+                replies = self.backend.complete_batch([r.messages for r in batch], max_tokens,
+                                                      batch[0].temperature, timeout)
+            for request, reply in zip(batch, replies):
+                request.future.set_result(reply)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get queueing statistics for monitoring"""
+        waits = sorted(self.queue_waits)
+        with self._ready:
+            queued = len(self._queue)
+        return {
+            "requests": self.requests,
+            "calls": self.calls,
+            "expired": self.expired,
+            "queued": queued,
+            "batching": self.batching,
+            "queue_wait_p50": waits[len(waits) // 2] if waits else 0.0,
+            "queue_wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+        }
+
+if __name__ == "__main__":
+    # Benchmark: concurrent callers against a local stand-in for an LLM server
+    import statistics
+
+    class StandInBackend(LLMBackend):
+        """Answers after a fixed per-call overhead plus a cost per conversation, one call at a time"""
+        name = "stand_in"
+
+        def __init__(self, batching: bool, overhead: float = 0.05, per_request: float = 0.01):
+            super().__init__("stand-in")
+            self.supports_batching = batching
+            self.overhead = overhead
+            self.per_request = per_request
+            self.server = threading.Lock()
+
+        def complete(self, messages, max_tokens=1024, temperature=0.7, timeout=None):
+            return self.complete_batch([messages], max_tokens, temperature, timeout)[0]
+
+        def complete_batch(self, conversations, max_tokens=1024, temperature=0.7, timeout=None):
+            with self.server:
+                time.sleep(self.overhead + self.per_request * len(conversations))
+            return [f"reply to {messages[-1]['content']}" for messages in conversations]
+
+    def run(label, send, callers=16, per_caller=10):
+        latencies = []
+        lock = threading.Lock()
+
+        def caller(number):
+            for i in range(per_caller):
+                start = time.monotonic()
+                reply = send([{"role": "user", "content": f"question {number}.{i}"}])
+                assert reply == f"reply to question {number}.{i}"
+                with lock:
+                    latencies.append(time.monotonic() - start)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=caller, args=(n,)) for n in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        latencies.sort()
+        print(f"{label:<28} {len(latencies) / elapsed:6.1f} req/s, latency p50 {statistics.median(latencies) * 1000:5.0f} ms"
+              f" p95 {latencies[int(len(latencies) * 0.95)] * 1000:5.0f} ms")
+
+    run("direct calls", StandInBackend(batching=False).complete)
+    scheduler = LLMScheduler(StandInBackend(batching=False))
+    run("scheduler, no batching", scheduler.complete)
+    metrics = scheduler.metrics()
+    print(f"{'':<28} {metrics['calls']} calls, queue wait p50 {metrics['queue_wait_p50'] * 1000:.0f} ms"
+          f" p95 {metrics['queue_wait_p95'] * 1000:.0f} ms")
+    scheduler = LLMScheduler(StandInBackend(batching=True))
+    run("scheduler, micro-batching", scheduler.complete)
+    metrics = scheduler.metrics()
+    print(f"{'':<28} {metrics['calls']} calls, queue wait p50 {metrics['queue_wait_p50'] * 1000:.0f} ms"
+          f" p95 {metrics['queue_wait_p95'] * 1000:.0f} ms")
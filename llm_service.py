@@ -1,91 +1,251 @@
 """
 Llama 3 Integration Service for the Voice Assistant
 
-This module provides integration with Together AI's Llama 3 model for advanced
-natural language processing capabilities.
+This module provides integration with Llama 3 for advanced natural language
+processing capabilities, either through Together AI or a local
+OpenAI-compatible server (see llm_backends.py and config.LLM_BACKEND).
 """
 
 import os
 import json
-import together
-from typing import Dict, List, Optional, Union
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
 import config
+from deadlines import current_deadline
+from llm_backends import LLMBackend, create_backend
+from llm_scheduler import LLMScheduler
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, hedged_call
+
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+")
+# A sentence that ends properly, allowing for a closing quote or bracket
+_COMPLETE_SENTENCE = re.compile(r"[.!?][\"')\]]*$")
+
+def spoken_word_budget(seconds: float) -> int:
+    """Words that can be spoken in the given time"""
+    return max(1, int(seconds * config.SPEECH_WORDS_PER_MINUTE / 60))
+
+def trim_to_sentence(text: str, max_words: Optional[int] = None) -> str:
+    """
+    Shorten text to whole sentences within a word budget
+
+    A trailing fragment without terminal punctuation, as left by a reply
+    cut off at max_tokens, is dropped even when the text is short enough.
+
+    Args:
+        text: The model's reply
+        max_words: Most words to keep, or None for no limit
+
+    Returns:
+        The sentences that fit, or the first max_words words if even the
+        first sentence is longer
+    """
+    sentences = _SENTENCE_END.split(text.strip())
+    if len(sentences) > 1 and not _COMPLETE_SENTENCE.search(sentences[-1]):
+        sentences.pop()
+    text = " ".join(sentences)
+    if max_words is None or len(text.split()) <= max_words:
+        return text
+    kept, words = [], 0
+    for sentence in sentences:
+        count = len(sentence.split())
+        if words + count > max_words:
+            break
+        kept.append(sentence)
+        words += count
+    if kept:
+        return " ".join(kept)
+    return " ".join(text.split()[:max_words]) + "..."
 
 class LlamaService:
-    def __init__(self):
-        """Initialize the Llama 3 service with the Together AI API"""
-        self.api_key = config.TOGETHER_API_KEY
-        together.api_key = self.api_key
-        self.model = config.LLAMA_MODEL
+    def __init__(self, backend: Optional[LLMBackend] = None):
+        """
+        Initialize the Llama 3 service
+        
+        Args:
+            backend: Backend to send requests to; defaults to the one selected
+                in config.LLM_BACKEND
+        """
+        self.backend = backend or create_backend()
+        self.model = self.backend.model
         self.system_prompt = config.SYSTEM_PROMPT
-        self.chat_history = []
+        # Every caller (e.g. each client of a shared assistant) has its own conversation
+        self.histories: Dict[str, List[Dict[str, str]]] = {}
+        self._history_lock = threading.Lock()
+        # Queues requests from concurrent callers, batching them when the backend can
+        self.scheduler = LLMScheduler(self.backend)
+        # Returns snippets of what the assistant knows that are relevant to a query
+        self.context_provider: Optional[Callable[[str], List[str]]] = None
         
-    def reset_chat(self):
-        """Reset the chat history"""
-        self.chat_history = []
+        # Tail-latency controls: hedge slow calls, fail fast when the backend is down
+        self.latency = LatencyTracker(
+            min_samples=config.LLM_HEDGE_MIN_SAMPLES,
+            default=config.LLM_HEDGE_DEFAULT_DELAY
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.LLM_BREAKER_FAILURES,
+            reset_timeout=config.LLM_BREAKER_RESET_SECONDS
+        )
+        # Threads here only wait on the scheduler, which caps the calls actually sent
+        self.executor = ThreadPoolExecutor(max_workers=config.LLM_MAX_WAITING_CALLERS, thread_name_prefix="llm")
         
-    def add_message(self, role: str, content: str):
-        """Add a message to the chat history"""
-        self.chat_history.append({"role": role, "content": content})
+    @property
+    def chat_history(self) -> List[Dict[str, str]]:
+        """The default caller's conversation"""
+        return self.histories.get("default", [])
+
+    def reset_chat(self, caller: Optional[str] = None):
+        """Reset one caller's chat history, or everyone's"""
+        with self._history_lock:
+            if caller is None:
+                self.histories.clear()
+            else:
+                self.histories.pop(caller, None)
+        
+    def add_message(self, role: str, content: str, caller: str = "default") -> Dict[str, str]:
+        """Add a message to a caller's chat history"""
+        message = {"role": role, "content": content}
+        with self._history_lock:
+            history = self.histories.setdefault(caller, [])
+            history.append(message)
+            # Only recent turns are kept; older ones reach the prompt through retrieval
+            del history[:-config.LLM_HISTORY_MESSAGES]
+        return message
+
+    def _remove_message(self, message: Dict[str, str], caller: str) -> None:
+        """Take a message back out of a caller's history"""
+        with self._history_lock:
+            history = self.histories.get(caller, [])
+            for i, other in enumerate(history):
+                if other is message:
+                    del history[i]
+                    break
         
-    def get_response(self, query: str, system_prompt: Optional[str] = None) -> str:
+    def get_response(self, query: str, system_prompt: Optional[str] = None, caller: str = "default",
+                     speaking_seconds: Optional[float] = None) -> str:
         """
         Get a response from the Llama 3 model
         
         Args:
             query: The user's query
             system_prompt: Optional custom system prompt to override the default
+            caller: Whose conversation the query belongs to
+            speaking_seconds: Size the answer to be spoken in about this many seconds
             
         Returns:
             The model's response as a string
+            
+        Raises:
+            TimeoutError: If no answer arrived within the deadline (plus config.LLM_LATE_REPLY_WAIT)
         """
+        question = None
         try:
             # Add user message to history
-            self.add_message("user", query)
+            question = self.add_message("user", query, caller)
             
             # Use custom system prompt if provided
             prompt = system_prompt if system_prompt else self.system_prompt
+            prompt = self._add_context(prompt, query)
+            max_words = spoken_word_budget(speaking_seconds) if speaking_seconds else None
+            if max_words:
+                prompt = f"{prompt}\n\n{config.SPOKEN_ANSWER_INSTRUCTION.format(words=max_words)}"
+            
+            # Build the conversation for the backend
+            formatted_messages = self._format_messages(prompt, caller)
             
-            # Use the Together Complete API with the Llama 3 chat format
-            formatted_messages = self._format_messages(prompt)
+            # Fit the answer into the command's latency budget and, when spoken, its speaking time
+            deadline = current_deadline()
+            timeout = deadline.remaining() if deadline else None
+            max_tokens = self._max_tokens(timeout, max_words)
+            # The caller stops waiting at the deadline, but an answer arriving a little
+            # later is still worth having: IntentRunner keeps it for the next ask
+            wait = None if timeout is None else timeout + config.LLM_LATE_REPLY_WAIT
             
-            # Complete API call
-            response = together.Complete.create(
-                model=self.model,
-                prompt=self._format_prompt_for_complete(formatted_messages),
-                temperature=0.7,
-                max_tokens=1024,
-                top_p=0.9,
-                top_k=50
+            # Send a hedged duplicate if the backend is slower than usual. Running out of
+            # time is the caller's budget, not a backend failure, so the breaker ignores it.
+            hedge_delay = self.latency.percentile(config.LLM_HEDGE_PERCENTILE)
+            response_text = self.breaker.call(
+                lambda: hedged_call(
+                    lambda: self._timed_complete(formatted_messages, max_tokens, wait),
+                    hedge_delay,
+                    self.executor,
+                    timeout=wait
+                ),
+                ignore=(TimeoutError,)
             )
             
-            # Extract response text
-            response_text = response['output']['choices'][0]['text']
+            # A reply cut off by max_tokens ends mid-sentence; keep only what fits the speaking time
+            response_text = trim_to_sentence(response_text, max_words)
             
             # Add assistant message to history
-            self.add_message("assistant", response_text)
+            self.add_message("assistant", response_text, caller)
             
             return response_text
             
+        except TimeoutError:
+            # Drop the unanswered question so it doesn't pile up in the history
+            if question is not None:
+                self._remove_message(question, caller)
+            raise
+        except CircuitOpenError:
+            if question is not None:
+                self._remove_message(question, caller)
+            return config.LLM_FALLBACK_REPLY
         except Exception as e:
             print(f"Error in LlamaService.get_response: {str(e)}")
             return f"I encountered an error: {str(e)}"
 
-    def _format_messages(self, system_prompt: str) -> List[Dict[str, str]]:
+    def _max_tokens(self, timeout: Optional[float], max_words: Optional[int] = None) -> int:
+        """Most tokens the model can generate in the time left, and say within max_words"""
+        limit = config.LLM_MAX_TOKENS
+        if max_words:
+            limit = min(limit, int(max_words * config.LLM_TOKENS_PER_WORD * config.LLM_SPOKEN_TOKEN_SLACK))
+        if timeout is None:
+            return max(config.LLM_MIN_TOKENS, limit)
+        return max(config.LLM_MIN_TOKENS, min(limit, int(timeout * config.LLM_TOKENS_PER_SECOND)))
+
+    def _timed_complete(self, messages: List[Dict[str, str]], max_tokens: int = 1024,
+                        timeout: Optional[float] = None) -> str:
+        """Call the backend once through the scheduler and record how long it took"""
+        start = time.monotonic()
+        response_text = self.scheduler.complete(messages, max_tokens=max_tokens, temperature=0.7, timeout=timeout)
+        self.latency.record(time.monotonic() - start)
+        return response_text
+
+    def _add_context(self, prompt: str, query: str) -> str:
+        """Add the stored memories relevant to the query to the system prompt"""
+        if not self.context_provider:
+            return prompt
+        try:
+            snippets = self.context_provider(query)
+        except Exception as e:
+            print(f"Error retrieving memories: {e}")
+            return prompt
+        if not snippets:
+            return prompt
+        facts = "\n".join(f"- {snippet}" for snippet in snippets)
+        return f"{prompt}\n\nThings you know about the user that may help:\n{facts}"
+
+    def _format_messages(self, system_prompt: str, caller: str = "default") -> List[Dict[str, str]]:
         """
         Format the messages for the Llama 3 model based on chat history
         
         Args:
             system_prompt: The system prompt to use
+            caller: Whose chat history to use
             
         Returns:
-            Formatted messages list for Together AI Chat API
+            Formatted messages list for the LLM backend
         """
         # Start with the system message
         messages = [{"role": "system", "content": system_prompt}]
         
         # Add all messages from chat history
-        for message in self.chat_history:
+        with self._history_lock:
+            history = list(self.histories.get(caller, []))
+        for message in history:
             messages.append({
                 "role": message["role"],
                 "content": message["content"]
@@ -0,0 +1,52 @@
+"""
+Custom command macros for the voice assistant
+
+A macro such as "good morning" = "weather, news and today's reminders" is
+validated and compiled once, when it is saved, into a sequence of built-in
+intents. Running it later just replays the stored plan.
+"""
+import re
+from typing import List
+import config
+from intents import Intent, parse_intent
+
+# Separators between the steps of a macro definition
+_STEP_SEPARATORS = re.compile(r"\s*(?:,|\+|;|\band then\b|\band\b|\bthen\b|\bplus\b)\s*")
+
+class MacroError(ValueError):
+    """Raised when a macro definition can't be compiled"""
+
+def compile_macro(definition: str) -> List[Intent]:
+    """
+    Compile a macro definition into a sequence of built-in intents
+
+    Args:
+        definition: Steps such as "weather in pune, tech news and today's reminders"
+
+    Returns:
+        The intents to run, in order
+
+    Raises:
+        MacroError: If a step isn't a built-in command or there are too many steps
+    """
+    steps = [step.strip() for step in _STEP_SEPARATORS.split(definition.lower()) if step.strip()]
+    if not steps:
+        raise MacroError("The command has no steps")
+    if len(steps) > config.MACRO_MAX_STEPS:
+        raise MacroError(f"A command can have at most {config.MACRO_MAX_STEPS} steps")
+
+    plan = []
+    for step in steps:
+        intent = parse_intent(step)
+        if intent is None:
+            raise MacroError(f"I don't know how to do '{step}' as part of a command")
+        plan.append(intent)
+    return plan
+
+def plan_to_json(plan: List[Intent]) -> List[List[str]]:
+    """Convert a compiled plan into a JSON-friendly list"""
+    return [[intent.name, intent.argument] for intent in plan]
+
+def plan_from_json(data: List[List[str]]) -> List[Intent]:
+    """Rebuild a compiled plan from its JSON form"""
+    return [Intent(name, argument) for name, argument in data]
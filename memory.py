@@ -1,17 +1,49 @@
 """
 Memory system for the voice assistant
+
+Memory is shared by the main loop, the hotword thread and the reminder
+thread. Its contents are an immutable snapshot: readers take the current
+snapshot without a lock, and every write builds a new one from the old,
+copying only the section it changes. Writes are serialized by one lock,
+and a single writer thread saves the latest snapshot to disk with an
+atomic file replace, so the file is never half written.
 """
+import atexit
 import json
 import os
-from typing import Dict, List, Any, Optional
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import config
-from utils import save_to_json, load_from_json
+from contacts import ContactIndex, normalize_name
+from intents import Intent
+from macros import MacroError, compile_macro, plan_from_json, plan_to_json
+from retrieval import MemoryIndex
+from utils import save_to_json_atomic, load_from_json
 
 class Memory:
     def __init__(self):
         """Initialize the memory system"""
         self.memory_file = config.MEMORY_FILE
-        self.memory = self._load_memory()
+        self._snapshot: Dict = self._load_memory()
+        self.macro_plans = self._load_macro_plans()
+        self.contacts = ContactIndex(self.memory.get('contacts', {}))
+        self._build_index()
+        
+        # Writers take the lock; the writer thread saves the newest version
+        self._write_lock = threading.Lock()
+        self._saved = threading.Condition()
+        self._version = 0
+        self._saved_version = 0
+        self._dirty = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="memory_writer")
+        self._writer.start()
+        atexit.register(self.flush)
+    
+    @property
+    def memory(self) -> Dict:
+        """The current snapshot; never modify it, use the Memory methods instead"""
+        return self._snapshot
         
     def _load_memory(self) -> Dict:
         """Load memory from file or create a new memory structure"""
@@ -24,71 +56,275 @@ class Memory:
                 "custom_commands": {}
             }
             self._save_memory(memory)
+        contacts = memory.get('contacts', {})
+        normalized = {normalize_name(name): email for name, email in contacts.items() if normalize_name(name)}
+        if normalized != contacts:
+            # Older memory files keyed contacts by name.lower(), which kept punctuation
+            memory['contacts'] = normalized
+            self._save_memory(memory)
         return memory
     
+    def _load_macro_plans(self) -> Dict[str, List[Intent]]:
+        """Load the compiled plan of every custom command"""
+        plans = {}
+        upgraded = False
+        for command, macro in self.memory.get('custom_commands', {}).items():
+            if isinstance(macro, str):
+                # Older memory files stored a bare action string; compile it once
+                try:
+                    plan = compile_macro(macro)
+                except MacroError as e:
+                    print(f"Skipping custom command '{command}': {e}")
+                    continue
+                self.memory['custom_commands'][command] = {"definition": macro, "plan": plan_to_json(plan)}
+                upgraded = True
+                plans[command] = plan
+            else:
+                plans[command] = plan_from_json(macro.get("plan", []))
+        if upgraded:
+            self._save_memory()
+        return plans
+    
+    def _build_index(self) -> None:
+        """Index preferences, contacts and conversations for retrieval"""
+        self.index = MemoryIndex()
+        self._conversation_keys = deque()
+        self._conversation_serial = 0
+        for key, value in self.memory.get('user_preferences', {}).items():
+            self._index_preference(key, value)
+        for name, email in self.memory.get('contacts', {}).items():
+            self._index_contact(name, email)
+        for conversation in self.memory.get('conversations', []):
+            self._index_conversation(conversation)
+    
+    def _index_preference(self, key: str, value: Any) -> None:
+        # Only free-text memories are useful to the LLM, not settings like voice_id
+        if isinstance(value, str):
+            self.index.add(f"preference:{key}", f"{key}: {value}")
+    
+    def _index_contact(self, name: str, email: str) -> None:
+        self.index.add(f"contact:{name}", f"{name}'s email address is {email}")
+    
+    def _index_conversation(self, conversation: Dict) -> None:
+        key = f"conversation:{self._conversation_serial}"
+        self._conversation_serial += 1
+        self._conversation_keys.append(key)
+        self.index.add(key, f"Earlier the user said: {conversation['query']}. You replied: {conversation['response']}")
+    
     def _save_memory(self, memory: Optional[Dict] = None) -> bool:
         """Save memory to file"""
         if memory is None:
             memory = self.memory
-        return save_to_json(memory, self.memory_file)
+        return save_to_json_atomic(memory, self.memory_file)
+    
+    def _write_loop(self) -> None:
+        """Writer thread: save the newest snapshot whenever memory changed"""
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            # Several quick writes are saved once, with the latest snapshot.
+            # _update publishes the snapshot before bumping the version, so reading the
+            # version first means the snapshot saved holds at least that version
+            version = self._version
+            snapshot = self._snapshot
+            self._save_memory(snapshot)
+            with self._saved:
+                self._saved_version = version
+                self._saved.notify_all()
+    
+    def flush(self, timeout: Optional[float] = 5) -> bool:
+        """
+        Wait until every change so far is on disk
+        
+        Returns:
+            bool: True if it was saved within the timeout
+        """
+        version = self._version
+        with self._saved:
+            return self._saved.wait_for(lambda: self._saved_version >= version, timeout)
+    
+    def _update(self, section: str, change: Callable[[Any], Any], default: Any) -> None:
+        """
+        Replace one section of memory with a changed copy
+        
+        Args:
+            section: Top-level key, e.g. 'contacts'
+            change: Gets a copy of the section, changes it and returns it
+            default: Empty value of the section, used when it is missing
+        """
+        snapshot = dict(self._snapshot)
+        current = snapshot.get(section, default)
+        snapshot[section] = change(current.copy())
+        self._snapshot = snapshot
+        self._version += 1
+        self._dirty.set()
     
     def add_conversation(self, query: str, response: str) -> None:
         """Add a conversation exchange to memory"""
-        if 'conversations' not in self.memory:
-            self.memory['conversations'] = []
-            
-        # Keep only the last 20 conversations
-        if len(self.memory['conversations']) > 20:
-            self.memory['conversations'].pop(0)
-            
-        self.memory['conversations'].append({
+        conversation = {
             "query": query,
             "response": response,
             "timestamp": str(os.path.getmtime(self.memory_file))
-        })
-        self._save_memory()
+        }
+        
+        def change(conversations: List[Dict]) -> List[Dict]:
+            # Keep only the last 20 conversations
+            if len(conversations) > 20:
+                conversations.pop(0)
+                if self._conversation_keys:
+                    self.index.remove(self._conversation_keys.popleft())
+            conversations.append(conversation)
+            return conversations
+        
+        with self._write_lock:
+            self._update('conversations', change, [])
+            self._index_conversation(conversation)
     
     def set_preference(self, key: str, value: Any) -> None:
         """Set a user preference"""
-        if 'user_preferences' not in self.memory:
-            self.memory['user_preferences'] = {}
-        self.memory['user_preferences'][key] = value
-        self._save_memory()
+        def change(preferences: Dict) -> Dict:
+            preferences[key] = value
+            return preferences
+        
+        with self._write_lock:
+            self._update('user_preferences', change, {})
+            self._index_preference(key, value)
     
     def get_preference(self, key: str, default: Any = None) -> Any:
         """Get a user preference"""
-        if 'user_preferences' not in self.memory:
-            return default
-        return self.memory['user_preferences'].get(key, default)
+        return self.memory.get('user_preferences', {}).get(key, default)
     
     def add_contact(self, name: str, email: str) -> None:
-        """Add a contact to memory"""
-        if 'contacts' not in self.memory:
-            self.memory['contacts'] = {}
-        self.memory['contacts'][name.lower()] = email
-        self._save_memory()
+        """Add a contact to memory, keyed by its name as ContactIndex normalizes it"""
+        name = normalize_name(name)
+        if not name:
+            return
+        
+        def change(contacts: Dict) -> Dict:
+            contacts[name] = email
+            return contacts
+        
+        with self._write_lock:
+            self._update('contacts', change, {})
+            self._index_contact(name, email)
+            self.contacts.add(name, email)
     
     def get_contact(self, name: str) -> Optional[str]:
         """Get a contact's email from memory"""
-        if 'contacts' not in self.memory:
-            return None
-        return self.memory['contacts'].get(name.lower())
-    
-    def add_custom_command(self, command: str, action: str) -> None:
-        """Add a custom command to memory"""
-        if 'custom_commands' not in self.memory:
-            self.memory['custom_commands'] = {}
-        self.memory['custom_commands'][command.lower()] = action
-        self._save_memory()
-    
-    def get_custom_command(self, command: str) -> Optional[str]:
-        """Get a custom command's action from memory"""
-        if 'custom_commands' not in self.memory:
-            return None
-        return self.memory['custom_commands'].get(command.lower())
+        return self.memory.get('contacts', {}).get(normalize_name(name))
+    
+    def suggest_contact(self, name: str) -> Optional[Tuple[str, str]]:
+        """
+        Find a stored contact whose name sounds like or is spelled close to a spoken name
+        
+        Returns:
+            The stored name, to confirm with the user ("Did you mean ...?"), and its email, or None
+        """
+        match = self.contacts.match(name)
+        return (match, self.contacts.emails[match]) if match else None
+    
+    def add_custom_command(self, command: str, action: str) -> Tuple[bool, str]:
+        """
+        Add a custom command to memory
+        
+        The action is compiled into a sequence of built-in intents right
+        away, so running the command later never has to parse it again.
+        
+        Args:
+            command: Phrase that triggers the command, e.g. "good morning"
+            action: What it does, e.g. "weather, news and today's reminders"
+            
+        Returns:
+            Tuple[bool, str]: Success status and message
+        """
+        try:
+            plan = compile_macro(action)
+        except MacroError as e:
+            return False, str(e)
+        
+        command = command.strip().lower()
+        
+        def change(commands: Dict) -> Dict:
+            commands[command] = {"definition": action, "plan": plan_to_json(plan)}
+            return commands
+        
+        with self._write_lock:
+            self._update('custom_commands', change, {})
+            # Replaced rather than changed, so readers never see it mid-update
+            self.macro_plans = {**self.macro_plans, command: plan}
+        return True, f"Saved '{command}' with {len(plan)} steps"
+    
+    def get_custom_command(self, command: str) -> Optional[List[Intent]]:
+        """Get a custom command's compiled plan from memory"""
+        return self.macro_plans.get(command.strip().lower())
+    
+    def relevant_context(self, query: str) -> List[str]:
+        """Get the memories, contacts and past conversations most relevant to a query"""
+        return self.index.context(query)
     
     def get_recent_conversations(self, count: int = 5) -> List[Dict]:
         """Get recent conversations from memory"""
-        if 'conversations' not in self.memory:
-            return []
-        return self.memory['conversations'][-count:]
+        return self.memory.get('conversations', [])[-count:]
+
+if __name__ == "__main__":
+    # Stress test: many threads writing and reading at once, then the saved file is checked
+    import tempfile
+    import time
+
+    config.MEMORY_FILE = os.path.join(tempfile.mkdtemp(), "memory.json")
+    memory = Memory()
+    writers, writes_each, errors = 8, 200, []
+    done = threading.Event()
+
+    def write(number):
+        for i in range(writes_each):
+            memory.set_preference(f"writer{number}", i)
+            memory.add_conversation(f"question {number}.{i}", f"answer {number}.{i}")
+            if i % 20 == 0:
+                memory.add_contact(f"Contact {number} {i // 20}", f"c{number}.{i}@example.com")
+
+    def read():
+        reads = 0
+        while not done.is_set():
+            snapshot = memory.memory
+            try:
+                # A snapshot never changes under its reader
+                text = json.dumps(snapshot)
+                assert json.loads(text) == snapshot
+                assert len(snapshot.get('conversations', [])) <= 21
+                memory.get_contact("contact 1 o")
+                memory.relevant_context("question answer")
+            except Exception as e:
+                errors.append(repr(e))
+            reads += 1
+        reader_counts.append(reads)
+
+    reader_counts = []
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    start = time.perf_counter()
+    for thread in readers + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in readers:
+        thread.join()
+    memory.flush()
+
+    expected_writes = writers * writes_each * 2 + writers * (writes_each // 20)
+    saved = load_from_json(config.MEMORY_FILE)
+    preferences = memory.memory['user_preferences']
+    problems = list(errors)
+    if saved != memory.memory:
+        problems.append("saved file differs from memory")
+    if any(preferences.get(f"writer{n}") != writes_each - 1 for n in range(writers)):
+        problems.append(f"lost preference updates: {preferences}")
+    if len(memory.memory['contacts']) != writers * (writes_each // 20):
+        problems.append(f"expected {writers * (writes_each // 20)} contacts, got {len(memory.memory['contacts'])}")
+    if len(memory.memory['conversations']) != 21:
+        problems.append(f"expected 21 conversations, got {len(memory.memory['conversations'])}")
+    print(f"{expected_writes} writes from {writers} threads in {elapsed:.2f} s, "
+          f"{sum(reader_counts)} consistent snapshot reads")
+    print("OK" if not problems else "\n".join(problems[:10]))
@@ -0,0 +1,235 @@
+"""
+Indexed local music library for the voice assistant
+
+The library is walked once and stored in a JSON index. Later rescans only
+re-list directories whose modification time changed, and "play <song>" is
+answered through a token index with fuzzy matching instead of a
+directory listing.
+"""
+import difflib
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import config
+from utils import save_to_json, load_from_json
+
+AUDIO_EXTENSIONS = {".mp3", ".flac", ".wav", ".ogg", ".m4a", ".aac", ".wma", ".opus"}
+
+def normalize(text: str) -> str:
+    """Lower-case text and reduce it to words separated by single spaces"""
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower().replace("_", " ")).split())
+
+def parse_track(filename: str) -> Tuple[str, str]:
+    """
+    Parse artist and title from a file name like '01 - Artist - Title.mp3'
+
+    Returns:
+        Tuple[str, str]: Artist (may be empty) and title
+    """
+    stem = os.path.splitext(filename)[0].replace("_", " ")
+    # Drop leading track numbers such as "01 ", "01. " or "01 - "
+    stem = re.sub(r"^\d{1,3}\s*[-.)]?\s+", "", stem).strip()
+    if " - " in stem:
+        artist, title = stem.split(" - ", 1)
+        return artist.strip(), title.strip()
+    return "", stem
+
+class MusicLibrary:
+    def __init__(self, music_dir: Optional[str] = None, index_file: Optional[str] = None):
+        """
+        Initialize the music library
+
+        Args:
+            music_dir: Root directory of the music collection
+            index_file: Where the persistent index is stored
+        """
+        self.music_dir = music_dir or config.MUSIC_DIR
+        self.index_file = index_file or config.MUSIC_INDEX_FILE
+        self.index = self._load_index()
+        self.tracks: List[Dict[str, str]] = []
+        self.last_refresh = 0.0
+        self._postings: Dict[str, List[int]] = {}
+        self._prefixes: Dict[str, List[str]] = {}
+        self._refresh_lock = threading.Lock()
+        self._build_search()
+
+    def _load_index(self) -> Dict:
+        """Load the index from file, discarding it if it belongs to another directory"""
+        index = load_from_json(self.index_file)
+        if not index or index.get("root") != self.music_dir:
+            index = {"root": self.music_dir, "dirs": {}}
+        return index
+
+    def refresh(self) -> int:
+        """
+        Bring the index up to date with the music directory
+
+        Only directories whose mtime changed are listed again; adding or
+        removing a file or subdirectory always changes its parent's mtime.
+
+        Returns:
+            int: Number of directories that were rescanned
+        """
+        with self._refresh_lock:
+            old_dirs = self.index["dirs"]
+            new_dirs = {}
+            rescanned = 0
+            stack = [self.music_dir] if os.path.isdir(self.music_dir) else []
+
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+
+                entry = old_dirs.get(path)
+                if entry is None or entry["mtime"] != mtime:
+                    entry = self._scan_dir(path, mtime)
+                    if entry is None:
+                        continue
+                    rescanned += 1
+
+                new_dirs[path] = entry
+                stack.extend(os.path.join(path, name) for name in entry["subdirs"])
+
+            changed = rescanned > 0 or len(new_dirs) != len(old_dirs)
+            self.index = {"root": self.music_dir, "dirs": new_dirs}
+            self.last_refresh = time.monotonic()
+            if changed:
+                save_to_json(self.index, self.index_file)
+                self._build_search()
+            return rescanned
+
+    def refresh_if_stale(self) -> int:
+        """Refresh the index if the last refresh is older than the rescan interval"""
+        if time.monotonic() - self.last_refresh < config.MUSIC_RESCAN_INTERVAL:
+            return 0
+        return self.refresh()
+
+    def _scan_dir(self, path: str, mtime: float) -> Optional[Dict]:
+        """List one directory's audio files and subdirectories"""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                        artist, title = parse_track(entry.name)
+                        files.append([entry.name, artist, title])
+        except OSError as e:
+            print(f"Error scanning music directory {path}: {e}")
+            return None
+        return {"mtime": mtime, "files": sorted(files), "subdirs": sorted(subdirs)}
+
+    def _build_search(self) -> None:
+        """Build the track list and token index used by search"""
+        tracks = []
+        postings: Dict[str, List[int]] = {}
+        for path in sorted(self.index["dirs"]):
+            for name, artist, title in self.index["dirs"][path]["files"]:
+                key = normalize(f"{artist} {title}")
+                track_id = len(tracks)
+                tracks.append({"path": os.path.join(path, name), "artist": artist, "title": title, "key": key})
+                for token in set(key.split()):
+                    postings.setdefault(token, []).append(track_id)
+
+        prefixes: Dict[str, List[str]] = {}
+        for token in postings:
+            prefixes.setdefault(token[:1], []).append(token)
+
+        # Swap in the new structures in one go so searches never see a half-built index
+        self.tracks, self._postings, self._prefixes = tracks, postings, prefixes
+
+    def _similar_tokens(self, token: str) -> List[Tuple[str, float]]:
+        """Find index tokens that match a query token exactly, by prefix or fuzzily"""
+        if token in self._postings:
+            return [(token, 1.0)]
+        bucket = self._prefixes.get(token[:1], [])
+        matches = [(t, 0.9) for t in bucket if len(token) >= 3 and t.startswith(token)]
+        if matches:
+            return matches[:10]
+        return [(t, difflib.SequenceMatcher(None, token, t).ratio())
+                for t in difflib.get_close_matches(token, bucket, n=3, cutoff=0.75)]
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, Dict[str, str]]]:
+        """
+        Fuzzy-search the library by artist and title
+
+        Args:
+            query: Spoken song request, e.g. "bohemian rhapsody by queen"
+            limit: Maximum number of results
+
+        Returns:
+            List of (score, track) pairs, best first; scores range from 0 to 1
+        """
+        tracks, postings = self.tracks, self._postings
+        query = normalize(re.sub(r"\bby\b", " ", query))
+        tokens = query.split()
+        if not tokens or not tracks:
+            return []
+
+        # Words that appear in most of the library say little about the song
+        common = max(50, len(tracks) * 0.2)
+        coverage: Dict[int, float] = {}
+        for token in tokens:
+            best: Dict[int, float] = {}
+            for match, similarity in self._similar_tokens(token):
+                ids = postings[match]
+                if len(ids) > common and len(tokens) > 1:
+                    continue
+                for track_id in ids:
+                    if similarity > best.get(track_id, 0.0):
+                        best[track_id] = similarity
+            for track_id, similarity in best.items():
+                coverage[track_id] = coverage.get(track_id, 0.0) + similarity / len(tokens)
+
+        # Only the best candidates get the more expensive whole-string comparison
+        candidates = sorted(coverage.items(), key=lambda item: item[1], reverse=True)[:50]
+        results = []
+        for track_id, score in candidates:
+            track = tracks[track_id]
+            ratio = difflib.SequenceMatcher(None, query, track["key"]).ratio()
+            results.append((0.7 * score + 0.3 * ratio, track))
+        results.sort(key=lambda item: item[0], reverse=True)
+        return results[:limit]
+
+    def find(self, query: str) -> Optional[Dict[str, str]]:
+        """Get the best matching track, or None if nothing matches well enough"""
+        results = self.search(query, limit=1)
+        if results and results[0][0] >= config.MUSIC_MATCH_THRESHOLD:
+            return results[0][1]
+        return None
+
+if __name__ == "__main__":
+    # Benchmark: search latency on a synthetic 100k-file library
+    import random
+    import string
+    import tempfile
+
+    random.seed(0)
+    words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9))) for _ in range(5000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        library = MusicLibrary(music_dir=tmp, index_file=os.path.join(tmp, "index.json"))
+        dirs = {}
+        for i in range(100000):
+            artist = " ".join(random.choices(words, k=2))
+            title = " ".join(random.choices(words, k=random.randint(1, 4)))
+            dirs.setdefault(os.path.join(tmp, artist), []).append([f"{artist} - {title}.mp3", artist, title])
+        library.index["dirs"] = {path: {"mtime": 0, "files": files, "subdirs": []} for path, files in dirs.items()}
+
+        start = time.perf_counter()
+        library._build_search()
+        print(f"Built search index for {len(library.tracks)} tracks in {time.perf_counter() - start:.2f}s")
+
+        queries = [random.choice(library.tracks)["title"] for _ in range(200)]
+        # Misspell half of the queries by dropping a letter
+        queries = [q if i % 2 else q[:2] + q[3:] for i, q in enumerate(queries)]
+        start = time.perf_counter()
+        hits = sum(1 for q in queries if library.find(q))
+        elapsed = (time.perf_counter() - start) / len(queries) * 1000
+        print(f"{elapsed:.2f} ms per search, {hits}/{len(queries)} queries matched")
@@ -0,0 +1,184 @@
+"""
+Local news snapshot for the voice assistant
+
+Headlines for each category are refreshed in the background with
+conditional requests and kept as compact records. A story that appears in
+several categories is stored once, keyed by a hash of its normalized
+title. Voice requests are answered from the snapshot with a dictionary
+lookup instead of downloading a full NewsAPI payload every time.
+"""
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import requests
+import config
+
+# Sends a GET request: fetch(url, headers, background) -> response
+Fetcher = Callable[[str, Dict[str, str], bool], requests.Response]
+
+class Headline(NamedTuple):
+    title: str
+    source: str
+
+def split_source(title: str) -> Tuple[str, str]:
+    """Split NewsAPI's "Title - Source" into the title and the source"""
+    title, sep, source = title.rpartition(" - ")
+    if not sep or not title:
+        return source.strip(), ""
+    return title.strip(), source.strip()
+
+def story_key(title: str) -> str:
+    """Hash of a normalized headline, equal for the same story in every category"""
+    normalized = " ".join(re.sub(r"[^\w]+", " ", title.lower()).split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+class NewsSnapshot:
+    def __init__(self, fetch: Fetcher, api_key: Optional[str] = None):
+        """
+        Initialize the news snapshot
+
+        Args:
+            fetch: Sends a GET request within the news provider's rate limit
+            api_key: NewsAPI key
+        """
+        self.fetch = fetch
+        self.api_key = api_key or config.NEWS_API_KEY
+        self.max_headlines = config.NEWS_SNAPSHOT_SIZE
+        # Every story once, and each category as an ordered list of story keys
+        self.stories: Dict[str, Headline] = {}
+        self.categories: Dict[str, List[str]] = {}
+        self.refreshed_at: Dict[str, float] = {}
+        # ETag / Last-Modified of the last response per category
+        self.validators: Dict[str, Dict[str, str]] = {}
+        # Spoken answers for the default headline count, rebuilt on refresh
+        self._summaries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def is_fresh(self, category: str) -> bool:
+        """Check whether a category was refreshed recently enough to answer from"""
+        return self.time_to_live(category) > 0
+
+    def time_to_live(self, category: str) -> float:
+        """Get the seconds left before a category goes stale (0 if never fetched)"""
+        refreshed_at = self.refreshed_at.get(category)
+        if refreshed_at is None:
+            return 0.0
+        return max(0.0, refreshed_at + config.NEWS_CACHE_TTL - time.monotonic())
+
+    def refresh_category(self, category: str, background: bool = False) -> Tuple[bool, str]:
+        """
+        Fetch a category's headlines, sending the validators of the previous response
+
+        Args:
+            category: NewsAPI category
+            background: The request isn't for the user (e.g. prefetching)
+
+        Returns:
+            Tuple[bool, str]: Success status and an error message on failure
+        """
+        url = f"https://newsapi.org/v2/top-headlines?country=us&category={category}&apiKey={self.api_key}"
+        headers = {}
+        validators = self.validators.get(category, {})
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        response = self.fetch(url, headers, background)
+        if response.status_code == 304 and category in self.categories:
+            self.refreshed_at[category] = time.monotonic()
+            return True, ""
+
+        data = response.json()
+        if response.status_code != 200 or data.get("status") != "ok":
+            return False, f"Error: {data.get('message', 'Unknown error')}"
+
+        keys = []
+        stories = {}
+        for article in data.get("articles", []):
+            title, source = split_source(article.get("title") or "")
+            if not title or title == "[Removed]":
+                continue
+            key = story_key(title)
+            if key in stories:
+                continue
+            stories[key] = Headline(title, source or (article.get("source") or {}).get("name", ""))
+            keys.append(key)
+            if len(keys) >= self.max_headlines:
+                break
+
+        with self._lock:
+            self.stories.update(stories)
+            self.categories[category] = keys
+            self.refreshed_at[category] = time.monotonic()
+            self.validators[category] = {
+                name: response.headers[header]
+                for name, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+                if header in response.headers
+            }
+            self._summaries[category] = self._summarize(category, config.NEWS_HEADLINE_COUNT)
+            # Drop stories no category refers to anymore
+            live = {key for keys in self.categories.values() for key in keys}
+            self.stories = {key: story for key, story in self.stories.items() if key in live}
+        return True, ""
+
+    def refresh(self, categories: List[str], background: bool = True) -> int:
+        """
+        Refresh several categories at once
+
+        Returns:
+            int: Number of categories refreshed successfully
+        """
+        def refresh_one(category):
+            try:
+                return self.refresh_category(category, background)[0]
+            except Exception as e:
+                print(f"Error refreshing {category} news: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=min(len(categories), config.FANOUT_MAX_WORKERS) or 1) as executor:
+            return sum(executor.map(refresh_one, categories))
+
+    def headlines(self, categories: List[str], count: int) -> List[Headline]:
+        """
+        Get the top headlines of one or more categories, each story only once
+
+        Args:
+            categories: Categories in order of preference
+            count: Maximum number of headlines
+        """
+        seen = set()
+        result = []
+        for category in categories:
+            for key in self.categories.get(category, []):
+                if key not in seen and key in self.stories:
+                    seen.add(key)
+                    result.append(self.stories[key])
+                    if len(result) >= count:
+                        return result
+        return result
+
+    def _summarize(self, category: str, count: int) -> str:
+        """Build the spoken list of a category's headlines"""
+        headlines = self.headlines([category], count)
+        if not headlines:
+            return ""
+        text = f"Here are the top {len(headlines)} {category} news headlines:\n"
+        for i, headline in enumerate(headlines):
+            text += f"{i+1}. {headline.title}\n"
+        return text
+
+    def summary(self, category: str, count: int = 5) -> Optional[str]:
+        """
+        Get the spoken headline summary for a category from the snapshot
+
+        Returns:
+            The summary, or None if the category has no headlines yet
+        """
+        if count == config.NEWS_HEADLINE_COUNT and category in self._summaries:
+            return self._summaries[category] or None
+        with self._lock:
+            return self._summarize(category, count) or None
@@ -0,0 +1,126 @@
+"""
+Idle-time prefetching for the voice assistant
+
+While nobody is talking to the assistant, this warms connections to the
+LLM backend and external hosts and fills the response cache with the
+requests the user is most likely to make next (weather for the default
+city, the news snapshot).
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, List
+import config
+from api_services import APIServices, weather_cache_key
+
+class Prefetcher:
+    def __init__(self, apis: APIServices):
+        """
+        Initialize the prefetcher
+
+        Args:
+            apis: The API services whose session and cache should be warmed
+        """
+        self.apis = apis
+        self.idle_seconds = config.PREFETCH_IDLE_SECONDS
+        self.interval = config.PREFETCH_INTERVAL
+        self.request_budget = config.PREFETCH_REQUEST_BUDGET
+        self.prefetch_thread = None
+        self.running = False
+        self._busy = threading.Event()
+        self._wakeup = threading.Event()
+        self._last_activity = time.monotonic()
+        self._last_round = 0.0
+        self._request_times = deque()
+
+    def begin_interaction(self) -> None:
+        """Tell the prefetcher a user interaction started; it stops sending requests"""
+        self._busy.set()
+        self._last_activity = time.monotonic()
+
+    def end_interaction(self) -> None:
+        """Tell the prefetcher the user interaction finished"""
+        self._last_activity = time.monotonic()
+        self._busy.clear()
+        self._wakeup.set()
+
+    def is_idle(self) -> bool:
+        """Check whether the assistant has been idle long enough to prefetch"""
+        if self._busy.is_set():
+            return False
+        return time.monotonic() - self._last_activity >= self.idle_seconds
+
+    def remaining_budget(self) -> int:
+        """Get how many prefetch requests are still allowed this hour"""
+        cutoff = time.monotonic() - 3600
+        while self._request_times and self._request_times[0] < cutoff:
+            self._request_times.popleft()
+        return max(0, self.request_budget - len(self._request_times))
+
+    def _spend(self, request: Callable[[], object]) -> bool:
+        """Run one prefetch request if the assistant is idle and budget remains"""
+        if not self.running or not self.is_idle() or self.remaining_budget() <= 0:
+            return False
+        self._request_times.append(time.monotonic())
+        request()
+        return True
+
+    def _tasks(self) -> List[Callable[[], object]]:
+        """Build the list of requests for one prefetch round"""
+        tasks = [self.apis.llm.backend.warm_up]
+        tasks += [lambda url=url: self.apis.warm_up(url) for url in config.PREFETCH_WARMUP_URLS]
+
+        # Only refresh entries that would go stale before the next round
+        city = config.DEFAULT_CITY
+        if self.apis.weather_api_key and self.apis.cache.time_to_live(weather_cache_key(city)) < self.interval:
+            tasks.append(lambda: self.apis.get_weather(city, refresh=True, background=True))
+        stale = [category for category in config.NEWS_SNAPSHOT_CATEGORIES
+                 if self.apis.news.time_to_live(category) < self.interval]
+        if self.apis.news_api_key and stale:
+            tasks.append(lambda: self.apis.news.refresh(stale))
+        return tasks
+
+    def run_once(self) -> int:
+        """
+        Run a single prefetch round
+
+        Returns:
+            int: Number of requests sent
+        """
+        sent = 0
+        for task in self._tasks():
+            # Back off completely as soon as the user starts talking
+            if not self._spend(task):
+                break
+            sent += 1
+        self._last_round = time.monotonic()
+        return sent
+
+    def _prefetch_loop(self):
+        """Background thread that prefetches while the assistant is idle"""
+        while self.running:
+            self._wakeup.clear()
+            if self.is_idle() and time.monotonic() - self._last_round >= self.interval:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"Error during prefetch: {e}")
+
+            # Sleep until the idle period is over or an interaction ends
+            self._wakeup.wait(self.idle_seconds)
+
+    def start(self):
+        """Start the prefetch thread"""
+        if not self.running:
+            self.running = True
+            self._last_round = time.monotonic() - self.interval
+            self.prefetch_thread = threading.Thread(target=self._prefetch_loop)
+            self.prefetch_thread.daemon = True
+            self.prefetch_thread.start()
+
+    def stop(self):
+        """Stop the prefetch thread"""
+        self.running = False
+        self._wakeup.set()
+        if self.prefetch_thread:
+            self.prefetch_thread.join(timeout=1)
@@ -0,0 +1,203 @@
+"""
+Per-command profiling for the voice assistant (Assistant.py --profile)
+
+While a command runs, a sampling thread records the Python stacks of the
+threads doing its work. Samples are written per intent as collapsed
+stacks, which flamegraph.pl, speedscope and inferno read directly.
+Sampling only runs during commands and costs little, so the assistant
+can be left in this mode. With --profile-memory, tracemalloc snapshots
+taken after each command are compared with the previous one to show
+which lines keep allocating memory over a long session; tracing every
+allocation is much more expensive, so it is opt-in.
+"""
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import config
+from intents import parse_intent, split_query
+
+# Commands Assistant.py handles before its provider intents, in the same order
+_EARLY_COMMANDS = [
+    ("custom_command", re.compile(r"create a command|new custom command|create a custom command")),
+    ("wikipedia", re.compile(r"wikipedia")),
+    ("open", re.compile(r"^open |open (youtube|google|stackoverflow|code|visual studio code)")),
+    ("time", re.compile(r"the time")),
+    ("date", re.compile(r"the date|today's date")),
+    ("music", re.compile(r"play music|play a song|^play ")),
+    ("email", re.compile(r"send (an )?email")),
+]
+# Commands handled after the provider intents
+_LATE_COMMANDS = [
+    ("reminder", re.compile(r"reminder|remind me")),
+    ("remember", re.compile(r"remember this")),
+    ("recall", re.compile(r"what do you remember about|recall")),
+    ("voice", re.compile(r"change voice")),
+    ("hot_word", re.compile(r"enable hot word|use wake word")),
+    ("exit", re.compile(r"terminate|exit|quit|goodbye")),
+]
+
+def command_label(query: str) -> str:
+    """
+    Name of the intent a command belongs to, used for its profile file
+
+    Queries no command handles go to the LLM and are labelled "llm", so
+    free-form questions share one profile instead of one per first word.
+    """
+    query = query.lower().strip()
+    if len(split_query(query)) > 1:
+        return "compound"
+    for label, pattern in _EARLY_COMMANDS:
+        if pattern.search(query):
+            return label
+    intent = parse_intent(query)
+    if intent:
+        return intent.name
+    for label, pattern in _LATE_COMMANDS:
+        if pattern.search(query):
+            return label
+    return "llm"
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _is_idle(frame) -> bool:
+    """Check whether a thread is parked waiting for work"""
+    code = frame.f_code
+    filename = code.co_filename.replace("\\", "/")
+    return ((code.co_name == "_worker" and filename.endswith("concurrent/futures/thread.py"))
+            or (code.co_name == "wait" and filename.endswith("threading.py")))
+
+class SamplingProfiler:
+    def __init__(self, interval: Optional[float] = None):
+        """
+        Initialize the sampling profiler
+
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = config.PROFILE_SAMPLE_INTERVAL if interval is None else interval
+        self.samples: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _include(self, thread: threading.Thread) -> bool:
+        """Sample the thread running the command and the pools it hands work to"""
+        return thread.ident == self._target or thread.name.startswith(config.PROFILE_THREAD_PREFIXES)
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread in threading.enumerate():
+                frame = frames.get(thread.ident)
+                if frame is None or thread.ident == own or not self._include(thread) or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                root = "command" if thread.ident == self._target else thread.name.split("_")[0]
+                stack.append(root)
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self, target: Optional[int] = None) -> None:
+        """Start sampling; target is the ident of the thread running the command"""
+        self.samples = Counter()
+        self._target = target or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True, name="profiler")
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the collapsed stacks with their sample counts"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.samples
+
+class CommandProfiler:
+    def __init__(self, output_dir: Optional[str] = None, trace_memory: Optional[bool] = None):
+        """
+        Initialize the command profiler
+
+        Args:
+            output_dir: Directory for the collapsed-stack and allocation files
+            trace_memory: Take tracemalloc snapshots between commands
+        """
+        self.output_dir = output_dir or config.PROFILE_DIR
+        self.trace_memory = config.PROFILE_TRACE_MEMORY if trace_memory is None else trace_memory
+        self.sampler = SamplingProfiler()
+        self.stacks: Dict[str, Counter] = {}
+        self._previous = None
+        self._lock = threading.Lock()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(config.PROFILE_TRACEBACK_FRAMES)
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        """Profile the command run inside the with block"""
+        # Commands don't overlap; if one somehow does, it just isn't profiled
+        if not self._lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            self.sampler.start()
+            try:
+                yield
+            finally:
+                samples = self.sampler.stop()
+                wall = time.perf_counter() - wall_start
+                cpu = time.process_time() - cpu_start
+                self._write_stacks(label, samples)
+                growth = self._write_allocations(label) if self.trace_memory else []
+                print(f"Profile [{label}]: {wall * 1000:.0f} ms wall, {cpu * 1000:.0f} ms CPU, "
+                      f"{sum(samples.values())} samples" +
+                      (f", {sum(stat.size_diff for stat in growth) / 1024:+.0f} KiB" if growth else ""))
+        finally:
+            self._lock.release()
+
+    def _write_stacks(self, label: str, samples: Counter) -> None:
+        """Merge a command's samples into its intent's collapsed-stack file"""
+        stacks = self.stacks.setdefault(label, Counter())
+        stacks.update(samples)
+        path = os.path.join(self.output_dir, f"{label}.collapsed")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"Error writing profile {path}: {e}")
+
+    def _write_allocations(self, label: str) -> List[tracemalloc.StatisticDiff]:
+        """Append the top allocation changes since the previous command"""
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        previous, self._previous = self._previous, snapshot
+        if previous is None:
+            return []
+
+        stats = snapshot.compare_to(previous, "lineno")
+        top = stats[:config.PROFILE_TOP_ALLOCATIONS]
+        path = os.path.join(self.output_dir, "allocations.log")
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(f"== {time.strftime('%Y-%m-%d %H:%M:%S')} {label}\n")
+                for stat in top:
+                    f.write(f"{stat}\n")
+                f.write("\n")
+        except OSError as e:
+            print(f"Error writing allocation profile {path}: {e}")
+        return stats
@@ -0,0 +1,192 @@
+"""
+Pluggable speech recognition engines for the voice assistant
+
+One captured audio buffer is sent to every configured engine at once
+(several Google locales, an offline Vosk model, ...). The race returns
+the first success or the most confident result instead of trying one
+locale after another.
+"""
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple
+import speech_recognition as sr
+import config
+
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+class RecognitionEngine:
+    """Base class for speech recognition engines"""
+    name = "base"
+
+    def recognize(self, audio: sr.AudioData) -> Tuple[str, float]:
+        """
+        Transcribe audio
+
+        Returns:
+            Tuple[str, float]: Transcript and confidence between 0 and 1
+
+        Raises:
+            sr.UnknownValueError: If the speech was unintelligible
+            sr.RequestError: If the engine couldn't be reached
+        """
+        raise NotImplementedError
+
+class GoogleRecognizer(RecognitionEngine):
+    def __init__(self, language: str, recognizer: Optional[sr.Recognizer] = None):
+        """
+        Initialize the Google Web Speech engine
+
+        Args:
+            language: Locale to recognize, e.g. "en-in"
+            recognizer: Recognizer to use; a new one is created if not given
+        """
+        self.language = language
+        self.name = f"google:{language}"
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def recognize(self, audio: sr.AudioData) -> Tuple[str, float]:
+        result = self.recognizer.recognize_google(audio, language=self.language, show_all=True)
+        if not result or not result.get("alternative"):
+            raise sr.UnknownValueError()
+        best = result["alternative"][0]
+        # Google only reports a confidence for the top alternative, and not always
+        return best["transcript"], best.get("confidence", 0.5)
+
+class VoskRecognizer(RecognitionEngine):
+    name = "vosk"
+
+    def __init__(self, model_path: Optional[str] = None):
+        """
+        Initialize the offline Vosk engine
+
+        Args:
+            model_path: Directory of a downloaded Vosk model
+        """
+        if vosk is None:
+            raise ImportError("Vosk is not installed. Run 'pip install vosk' to use offline recognition.")
+        self.model = vosk.Model(model_path or config.VOSK_MODEL_PATH)
+
+    def recognize(self, audio: sr.AudioData) -> Tuple[str, float]:
+        recognizer = vosk.KaldiRecognizer(self.model, 16000)
+        recognizer.SetWords(True)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=16000, convert_width=2))
+        result = json.loads(recognizer.FinalResult())
+        text = result.get("text", "")
+        if not text:
+            raise sr.UnknownValueError()
+        words = result.get("result", [])
+        confidence = sum(w.get("conf", 0) for w in words) / len(words) if words else 0.5
+        return text, confidence
+
+class FakeRecognizer(RecognitionEngine):
+    name = "fake"
+
+    def __init__(self, transcripts: List[str], latency: float = 0.0, confidence: float = 0.9):
+        """
+        Initialize a recognizer that returns prepared transcripts, for replay benchmarks
+
+        Args:
+            transcripts: Transcripts returned in order, one per recognized utterance
+            latency: Seconds each recognition takes, to stand in for a network round trip
+            confidence: Confidence reported with every transcript
+        """
+        self.transcripts = list(transcripts)
+        self.latency = latency
+        self.confidence = confidence
+
+    def recognize(self, audio: sr.AudioData) -> Tuple[str, float]:
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.transcripts:
+            raise sr.UnknownValueError()
+        return self.transcripts.pop(0), self.confidence
+
+def create_engine(spec: str, recognizer: Optional[sr.Recognizer] = None) -> RecognitionEngine:
+    """
+    Create an engine from a spec such as "google:en-in" or "vosk"
+
+    Args:
+        spec: Engine name, optionally followed by ":" and a locale
+        recognizer: Recognizer shared by the Google engines
+    """
+    name, _, option = spec.partition(":")
+    if name == "google":
+        return GoogleRecognizer(option or config.LANGUAGE, recognizer)
+    if name == "vosk":
+        return VoskRecognizer(option or None)
+    raise ValueError(f"Unknown recognition engine: {spec}")
+
+class RecognizerRace:
+    def __init__(self, engines: List[RecognitionEngine], mode: Optional[str] = None,
+                 timeout: Optional[float] = None):
+        """
+        Initialize the recognizer race
+
+        Args:
+            engines: Engines that all receive the same audio
+            mode: "first" returns the first success, "best" the most confident result
+            timeout: Seconds to wait for the engines before giving up
+        """
+        self.engines = engines
+        self.mode = mode or config.RECOGNITION_MODE
+        self.timeout = config.RECOGNITION_TIMEOUT if timeout is None else timeout
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(engines)), thread_name_prefix="recognizer")
+
+    def recognize(self, audio: sr.AudioData) -> Tuple[str, float, str]:
+        """
+        Send audio to every engine at once and pick a result
+
+        Returns:
+            Tuple[str, float, str]: Transcript, confidence and the name of the winning engine
+
+        Raises:
+            sr.UnknownValueError: If no engine understood the audio
+            sr.RequestError: If every engine failed to respond
+        """
+        futures = {self.executor.submit(engine.recognize, audio): engine for engine in self.engines}
+        pending = set(futures)
+        best = None
+        errors = []
+        deadline = time.monotonic() + self.timeout
+
+        while pending:
+            remaining = max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    text, confidence = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if best is None or confidence > best[1]:
+                    best = (text, confidence, futures[future].name)
+            if best and (self.mode == "first" or best[1] >= config.RECOGNITION_ACCEPT_CONFIDENCE):
+                break
+
+        # Don't wait for slower engines; requests that haven't started are dropped
+        for future in pending:
+            future.cancel()
+
+        if best:
+            return best
+        if pending and not errors:
+            raise sr.RequestError("Speech recognition timed out")
+        if errors and all(isinstance(e, sr.RequestError) for e in errors):
+            raise errors[0]
+        raise sr.UnknownValueError()
+
+def create_default_race(recognizer: Optional[sr.Recognizer] = None) -> RecognizerRace:
+    """Create a race of the engines listed in config.RECOGNITION_ENGINES"""
+    engines = []
+    for spec in config.RECOGNITION_ENGINES:
+        try:
+            engines.append(create_engine(spec, recognizer))
+        except Exception as e:
+            print(f"Skipping recognition engine {spec}: {e}")
+    return RecognizerRace(engines)
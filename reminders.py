@@ -1,20 +1,160 @@
 """
 Reminder system for the voice assistant
+
+Reminders can be added one at a time or in bulk, from a list or an
+iCalendar (.ics) file. A bulk import is validated as a whole, written to
+disk once and wakes the checker thread once, instead of rewriting the file
+and restarting the thread for every entry.
 """
 import json
 import os
 import datetime
 import threading
 import time
-from typing import Dict, List, Any, Optional, Callable
+import uuid
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Callable, TextIO, Tuple
 import config
 from utils import save_to_json, load_from_json
 
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+def _unescape_ics(text: str) -> str:
+    """Undo iCalendar TEXT escaping"""
+    out, i = [], 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text):
+            i += 1
+            c = "\n" if text[i] in "nN" else text[i]
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+def _escape_ics(text: str) -> str:
+    """Escape text for an iCalendar TEXT value"""
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def _fold_ics(line: str) -> str:
+    """Fold a content line to at most 75 octets per line, as iCalendar requires"""
+    if len(line.encode("utf-8")) <= 75:
+        return line + "\r\n"
+    parts, current, size = [], "", 0
+    for c in line:
+        width = len(c.encode("utf-8"))
+        if size + width > 75:
+            parts.append(current)
+            # Continuation lines start with a space, which counts towards their 75 octets
+            current, size = " ", 1
+        current += c
+        size += width
+    parts.append(current)
+    return "\r\n".join(parts) + "\r\n"
+
+def _ics_lines(stream: TextIO) -> Iterator[str]:
+    """Unfolded content lines of an iCalendar stream"""
+    pending = None
+    for raw in stream:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+def _parse_ics_date(value: str, params: Dict[str, str]) -> str:
+    """
+    Convert an iCalendar DATE or DATE-TIME to the reminder format in local time
+
+    Raises:
+        ValueError: If the value isn't a valid date
+    """
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        day = datetime.datetime.strptime(value, "%Y%m%d").date()
+        return f"{day.isoformat()} {config.REMINDER_ALL_DAY_TIME}"
+    utc = value.endswith("Z")
+    when = datetime.datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    if utc:
+        when = when.replace(tzinfo=datetime.timezone.utc).astimezone().replace(tzinfo=None)
+    elif "TZID" in params:
+        try:
+            from zoneinfo import ZoneInfo
+            when = when.replace(tzinfo=ZoneInfo(params["TZID"])).astimezone().replace(tzinfo=None)
+        except Exception:
+            # Unknown time zone: take the time as local, which is right for most personal calendars
+            pass
+    return when.strftime(DATE_FORMAT)
+
+def read_ics(stream: TextIO) -> Iterator[Dict[str, str]]:
+    """
+    Read the events and to-dos of an iCalendar stream as reminder entries
+
+    Yields:
+        Dicts with title, due_date and note. due_date is left empty if the
+        component has no usable start or due date, so validation reports it.
+    """
+    component, entry = None, {}
+    for line in _ics_lines(stream):
+        name, _, value = line.partition(":")
+        name, *param_list = name.split(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() in ("VEVENT", "VTODO"):
+            component, entry = value.upper(), {"title": "", "due_date": "", "note": ""}
+        elif name == "END" and value.upper() == component:
+            yield entry
+            component = None
+        elif component is None:
+            continue
+        elif name == "SUMMARY":
+            entry["title"] = _unescape_ics(value)
+        elif name == "DESCRIPTION":
+            entry["note"] = _unescape_ics(value)
+        elif name == "DTSTART" or (name == "DUE" and not entry["due_date"]):
+            params = dict(p.split("=", 1) for p in param_list if "=" in p)
+            try:
+                entry["due_date"] = _parse_ics_date(value.strip(), {k.upper(): v for k, v in params.items()})
+            except ValueError:
+                entry["due_date"] = value
+
+def make_reminder(title: str, due_date: Any, note: str = "",
+                  completed_before: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+    """
+    Build a reminder after checking its fields
+
+    Args:
+        title: Title of the reminder
+        due_date: When it is due, a datetime or 'YYYY-MM-DD HH:MM'
+        note: Additional notes
+        completed_before: Store the reminder as completed if it is due before this time
+
+    Raises:
+        ValueError: If the title is empty or the date is invalid
+    """
+    title = (title or "").strip()
+    if not title:
+        raise ValueError("reminder has no title")
+    if isinstance(due_date, datetime.datetime):
+        due_date = due_date.strftime(DATE_FORMAT)
+    try:
+        due = datetime.datetime.strptime(due_date, DATE_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid date {due_date!r} for {title!r}, expected YYYY-MM-DD HH:MM")
+    return {
+        "id": uuid.uuid4().hex,
+        "title": title,
+        "due_date": due_date,
+        "note": note or "",
+        "completed": completed_before is not None and due < completed_before
+    }
+
 class ReminderSystem:
     def __init__(self, callback: Callable[[str], None]):
         """
         Initialize the reminder system
-        
+
         Args:
             callback: Function to call when a reminder is due
         """
@@ -23,7 +163,9 @@ class ReminderSystem:
         self.callback = callback
         self.reminder_thread = None
         self.running = False
-        
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+
     def _load_reminders(self) -> List[Dict]:
         """Load reminders from file or create a new reminders list"""
         reminders = load_from_json(self.reminders_file)
@@ -31,117 +173,266 @@ class ReminderSystem:
             reminders = []
             self._save_reminders(reminders)
         return reminders
-    
+
     def _save_reminders(self, reminders: Optional[List] = None) -> bool:
         """Save reminders to file"""
         if reminders is None:
             reminders = self.reminders
         return save_to_json(reminders, self.reminders_file)
-    
+
+    def _notify(self) -> None:
+        """Wake the checker thread so it sees new reminders"""
+        self._wakeup.set()
+
     def add_reminder(self, title: str, datetime_str: str, note: str = "") -> bool:
         """
         Add a new reminder
-        
+
         Args:
             title: Title of the reminder
             datetime_str: When the reminder is due in 'YYYY-MM-DD HH:MM' format
             note: Additional notes for the reminder
-            
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        added, errors = self.add_reminders([{"title": title, "due_date": datetime_str, "note": note}],
+                                           include_past=True)
+        if errors:
+            print(f"Error adding reminder: {errors[0]}")
+        return added == 1
+
+    def add_reminders(self, entries: Iterable[Dict[str, Any]], strict: bool = False,
+                      include_past: bool = False) -> Tuple[int, List[str]]:
+        """
+        Add many reminders with one write to disk
+
+        Entries already due are stored as completed, so importing an old
+        calendar doesn't fire all of its past events at once.
+
+        Args:
+            entries: Dicts with title, due_date ('YYYY-MM-DD HH:MM' or a datetime) and optional note
+            strict: Add nothing if any entry is invalid
+            include_past: Keep entries that are already due active, so they fire right away
+
+        Returns:
+            Tuple[int, List[str]]: Number of reminders added and a message for each invalid entry
+        """
+        completed_before = None if include_past else datetime.datetime.now()
+        reminders, errors = [], []
+        for number, entry in enumerate(entries, 1):
+            try:
+                reminders.append(make_reminder(entry.get("title", ""), entry.get("due_date"), entry.get("note", ""),
+                                               completed_before))
+            except (AttributeError, ValueError) as e:
+                errors.append(f"entry {number}: {e}")
+        if not reminders or (strict and errors):
+            return 0, errors
+
+        with self._lock:
+            self.reminders.extend(reminders)
+            if not self._save_reminders():
+                del self.reminders[-len(reminders):]
+                return 0, errors + ["could not write the reminders file"]
+        self._notify()
+        return len(reminders), errors
+
+    def import_ics(self, path: str, strict: bool = False, include_past: bool = False) -> Tuple[int, List[str]]:
+        """
+        Add the events and to-dos of an iCalendar file as reminders
+
+        Args:
+            path: Path of the .ics file
+            strict: Add nothing if any entry is invalid
+            include_past: Keep past events active instead of storing them as completed
+
+        Returns:
+            Tuple[int, List[str]]: Number of reminders added and a message for each invalid entry
+        """
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                return self.add_reminders(read_ics(f), strict, include_past)
+        except OSError as e:
+            return 0, [f"could not read {path}: {e}"]
+
+    def iter_ics(self, include_completed: bool = False) -> Iterator[str]:
+        """Yield the reminders as iCalendar text, one content line at a time"""
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        yield "BEGIN:VCALENDAR\r\n"
+        yield "VERSION:2.0\r\n"
+        yield "PRODID:-//Voice Assistant//Reminders//EN\r\n"
+        with self._lock:
+            reminders = list(self.reminders)
+        for reminder in reminders:
+            if reminder.get("completed", False) and not include_completed:
+                continue
+            try:
+                due = datetime.datetime.strptime(reminder["due_date"], DATE_FORMAT)
+            except (KeyError, ValueError):
+                continue
+            yield "BEGIN:VEVENT\r\n"
+            yield _fold_ics(f"UID:{reminder.get('id', uuid.uuid4().hex)}@voice-assistant")
+            yield f"DTSTAMP:{stamp}\r\n"
+            yield f"DTSTART:{due.strftime('%Y%m%dT%H%M%S')}\r\n"
+            yield _fold_ics(f"SUMMARY:{_escape_ics(reminder.get('title', ''))}")
+            if reminder.get("note"):
+                yield _fold_ics(f"DESCRIPTION:{_escape_ics(reminder['note'])}")
+            yield "END:VEVENT\r\n"
+        yield "END:VCALENDAR\r\n"
+
+    def export_ics(self, path: str, include_completed: bool = False) -> bool:
+        """
+        Write the reminders to an iCalendar file without building it in memory
+
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            due_date = datetime.datetime.strptime(datetime_str, "%Y-%m-%d %H:%M")
-            
-            reminder = {
-                "id": str(int(time.time())),
-                "title": title,
-                "due_date": datetime_str,
-                "note": note,
-                "completed": False
-            }
-            
-            self.reminders.append(reminder)
-            self._save_reminders()
-            
-            # Restart the reminder thread to pick up the new reminder
-            if self.running:
-                self.stop()
-                self.start()
-                
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.writelines(self.iter_ics(include_completed))
             return True
-        except Exception as e:
-            print(f"Error adding reminder: {e}")
+        except OSError as e:
+            print(f"Error exporting reminders: {e}")
             return False
-    
+
     def remove_reminder(self, reminder_id: str) -> bool:
         """Remove a reminder by ID"""
-        for i, reminder in enumerate(self.reminders):
-            if reminder.get("id") == reminder_id:
-                self.reminders.pop(i)
-                self._save_reminders()
-                return True
+        with self._lock:
+            for i, reminder in enumerate(self.reminders):
+                if reminder.get("id") == reminder_id:
+                    self.reminders.pop(i)
+                    self._save_reminders()
+                    return True
         return False
-    
+
     def mark_completed(self, reminder_id: str) -> bool:
         """Mark a reminder as completed"""
-        for reminder in self.reminders:
-            if reminder.get("id") == reminder_id:
-                reminder["completed"] = True
+        return self._mark_completed({reminder_id}) > 0
+
+    def _mark_completed(self, reminder_ids: set) -> int:
+        """Mark reminders as completed with one write to disk"""
+        count = 0
+        with self._lock:
+            for reminder in self.reminders:
+                if reminder.get("id") in reminder_ids and not reminder.get("completed", False):
+                    reminder["completed"] = True
+                    count += 1
+            if count:
                 self._save_reminders()
-                return True
-        return False
-    
+        return count
+
     def get_reminders(self, include_completed: bool = False) -> List[Dict]:
         """Get all reminders"""
         if include_completed:
             return self.reminders
         return [r for r in self.reminders if not r.get("completed", False)]
-    
-    def get_due_reminders(self) -> List[Dict]:
+
+    def get_due_reminders(self, now: Optional[datetime.datetime] = None) -> List[Dict]:
         """Get reminders that are due now"""
-        now = datetime.datetime.now()
-        due_reminders = []
-        
-        for reminder in self.reminders:
+        return self._scan(now)[0]
+
+    def _scan(self, now: Optional[datetime.datetime] = None) -> Tuple[List[Dict], Optional[datetime.datetime]]:
+        """Find the reminders that are due and when the next one is"""
+        now = now or datetime.datetime.now()
+        due_reminders, next_due = [], None
+        with self._lock:
+            reminders = list(self.reminders)
+
+        for reminder in reminders:
             if reminder.get("completed", False):
                 continue
-                
+
             try:
-                due_date = datetime.datetime.strptime(reminder["due_date"], "%Y-%m-%d %H:%M")
-                if due_date <= now:
-                    due_reminders.append(reminder)
-            except:
+                due_date = datetime.datetime.strptime(reminder["due_date"], DATE_FORMAT)
+            except (KeyError, TypeError, ValueError):
                 continue
-                
-        return due_reminders
-    
+            if due_date <= now:
+                due_reminders.append(reminder)
+            elif next_due is None or due_date < next_due:
+                next_due = due_date
+
+        return due_reminders, next_due
+
     def _check_reminders(self):
         """Background thread that checks for due reminders"""
         while self.running:
-            due_reminders = self.get_due_reminders()
-            
+            self._wakeup.clear()
+            due_reminders, next_due = self._scan()
+
             for reminder in due_reminders:
                 message = f"Reminder: {reminder['title']}"
                 if reminder.get("note"):
                     message += f" - {reminder['note']}"
-                
+
                 self.callback(message)
-                self.mark_completed(reminder["id"])
-            
-            # Sleep for 60 seconds before checking again
-            time.sleep(60)
-    
+            if due_reminders:
+                self._mark_completed({reminder["id"] for reminder in due_reminders})
+
+            # Sleep until the next reminder is due, a new one is added or the periodic check
+            timeout = config.REMINDER_CHECK_INTERVAL
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, (next_due - datetime.datetime.now()).total_seconds()))
+            self._wakeup.wait(timeout)
+
     def start(self):
         """Start the reminder checking thread"""
         if not self.running:
             self.running = True
-            self.reminder_thread = threading.Thread(target=self._check_reminders)
+            self._wakeup.clear()
+            self.reminder_thread = threading.Thread(target=self._check_reminders, name="reminders")
             self.reminder_thread.daemon = True
             self.reminder_thread.start()
-    
+
     def stop(self):
         """Stop the reminder checking thread"""
         self.running = False
+        self._wakeup.set()
         if self.reminder_thread:
             self.reminder_thread.join(timeout=1)
+
+if __name__ == "__main__":
+    # Benchmark: importing 10k calendar entries at once vs. adding them one by one
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    config.REMINDERS_FILE = os.path.join(directory, "reminders.json")
+    start_day = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=1)
+    source = ReminderSystem(print)
+    entries = [{"title": f"Task {i}, part {i % 7}", "due_date": start_day + datetime.timedelta(minutes=15 * i),
+                "note": "Bring the report; call back" if i % 3 == 0 else ""} for i in range(10000)]
+    source.add_reminders(entries)
+    calendar = os.path.join(directory, "calendar.ics")
+
+    start = time.perf_counter()
+    source.export_ics(calendar)
+    print(f"Exported {len(source.reminders)} reminders in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    os.remove(config.REMINDERS_FILE)
+    reminders = ReminderSystem(print)
+    reminders.start()
+    start = time.perf_counter()
+    added, errors = reminders.import_ics(calendar)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {added} reminders ({len(errors)} invalid) in {elapsed * 1000:.0f} ms")
+    assert [(r["title"], r["due_date"], r["note"]) for r in reminders.reminders] == \
+           [(r["title"], r["due_date"], r["note"]) for r in source.reminders]
+    reminders.stop()
+
+    # Past calendar entries are kept as completed, so they don't all fire at once
+    past = [{"title": "Old meeting", "due_date": start_day - datetime.timedelta(days=30)}, entries[0]]
+    reminders.add_reminders(past)
+    assert [r["title"] for r in reminders.get_due_reminders()] == []
+    reminders.add_reminders(past[:1], include_past=True)
+    assert [r["title"] for r in reminders.get_due_reminders()] == ["Old meeting"]
+    print("Past calendar entries imported as completed unless include_past is set")
+
+    os.remove(config.REMINDERS_FILE)
+    reminders = ReminderSystem(print)
+    sample = [{"title": e["title"], "datetime_str": e["due_date"].strftime(DATE_FORMAT), "note": e["note"]}
+              for e in entries[:500]]
+    start = time.perf_counter()
+    for entry in sample:
+        reminders.add_reminder(**entry)
+    one_by_one = (time.perf_counter() - start) / len(sample)
+    print(f"add_reminder one by one: {one_by_one * 1000:.1f} ms each "
+          f"(at least {one_by_one * len(entries):.0f} s for {len(entries)})")
@@ -0,0 +1,243 @@
+"""
+Tail-latency and failure controls for slow backends
+
+- LatencyTracker keeps recent call latencies to pick a hedging delay
+- hedged_call sends a duplicate request when the first one is slow
+- CircuitBreaker fails fast after repeated backend failures
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Callable, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit breaker is open"""
+
+class LatencyTracker:
+    def __init__(self, window: int = 50, min_samples: int = 5, default: float = 4.0):
+        """
+        Initialize the latency tracker
+
+        Args:
+            window: Number of recent latencies to keep
+            min_samples: Samples needed before percentiles are trusted
+            default: Latency (seconds) reported until enough samples exist
+        """
+        self.min_samples = min_samples
+        self.default = default
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of a completed call"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> float:
+        """Get the given percentile (0-100) of recent latencies in seconds"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return self.default
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+def hedged_call(fn: Callable[[], T], hedge_delay: float, executor: Executor, max_attempts: int = 2,
+                timeout: Optional[float] = None) -> T:
+    """
+    Call fn, sending a duplicate call whenever the previous one is still
+    running after hedge_delay seconds. The first successful result wins.
+
+    Args:
+        fn: The call to make; must be safe to run more than once
+        hedge_delay: Seconds to wait before sending a duplicate
+        executor: Executor the calls run on
+        max_attempts: Total number of calls allowed in flight
+        timeout: Seconds to wait for any call to succeed
+
+    Returns:
+        The result of the first call to succeed
+
+    Raises:
+        TimeoutError: If no call succeeded within the timeout
+        The exception of the last call if every call fails
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = {executor.submit(fn)}
+    attempts = 1
+    error = None
+
+    while pending:
+        wait_for = hedge_delay if attempts < max_attempts else None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Abandon the calls; their results are ignored when they finish
+                for future in pending:
+                    future.cancel()
+                raise TimeoutError(f"No reply within {timeout:.1f} seconds")
+            wait_for = remaining if wait_for is None else min(wait_for, remaining)
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+
+        # Hedge only when the calls in flight are slow, not when they failed
+        if not done and attempts < max_attempts and (deadline is None or time.monotonic() < deadline):
+            pending.add(executor.submit(fn))
+            attempts += 1
+
+    raise error
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to stay open before allowing a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check whether a call may go through right now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                # Let a single trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        """Record a successful call and close the circuit"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if there were too many"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, fn: Callable[[], T], ignore: Tuple[Type[BaseException], ...] = ()) -> T:
+        """
+        Run fn through the circuit breaker
+
+        Args:
+            fn: The call to make
+            ignore: Exceptions that say nothing about the backend's health (e.g. the
+                caller's own deadline running out); they count as neither success nor failure
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        if not self.allow():
+            raise CircuitOpenError("Circuit breaker is open")
+        try:
+            result = fn()
+        except ignore:
+            with self._lock:
+                if self.state == self.HALF_OPEN:
+                    # Let the next call be the trial instead
+                    self.state = self.OPEN
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+if __name__ == "__main__":
+    # Check hedging and the circuit breaker through LlamaService with a fake backend
+    import config
+    from deadlines import Deadline, deadline_scope
+    from llm_backends import LLMBackend
+    from llm_service import LlamaService
+
+    class FakeBackend(LLMBackend):
+        """Plays back a script of (delay, error) per call; calls past the script answer at once"""
+        name = "fake"
+
+        def __init__(self):
+            super().__init__("fake")
+            self.script = []
+            self.calls = 0
+            self._lock = threading.Lock()
+
+        def complete(self, messages, max_tokens=1024, temperature=0.7, timeout=None):
+            with self._lock:
+                self.calls += 1
+                number = self.calls
+                delay, error = self.script.pop(0) if self.script else (0, None)
+            time.sleep(delay)
+            if error:
+                raise error
+            return f"Reply from call {number}."
+
+    config.LLM_LATE_REPLY_WAIT = 0
+    backend = FakeBackend()
+    service = LlamaService(backend=backend)
+    service.breaker.reset_timeout = 0.3
+    for _ in range(service.latency.min_samples):
+        service.latency.record(0.05)
+
+    # The first call stalls; a duplicate goes out after the p95 delay and its reply wins
+    backend.script = [(1.0, None), (0.01, None)]
+    start = time.monotonic()
+    reply = service.get_response("hello")
+    elapsed = time.monotonic() - start
+    assert reply == "Reply from call 2." and backend.calls == 2 and elapsed < 0.5, (reply, backend.calls, elapsed)
+    print(f"ok   hedge sent after {service.latency.percentile(config.LLM_HEDGE_PERCENTILE):.2f} s, "
+          f"faster reply won in {elapsed:.2f} s")
+    time.sleep(1.0)
+
+    # Repeated backend errors open the breaker, which then answers with the canned reply
+    backend.calls = 0
+    backend.script = [(0, RuntimeError("server error"))] * service.breaker.failure_threshold
+    for _ in range(service.breaker.failure_threshold):
+        assert service.get_response("hello").startswith("I encountered an error")
+    assert service.breaker.state == CircuitBreaker.OPEN
+    assert service.get_response("hello") == config.LLM_FALLBACK_REPLY
+    assert backend.calls == service.breaker.failure_threshold
+    print(f"ok   breaker opened after {service.breaker.failure_threshold} failures, canned reply without calling")
+
+    # After reset_timeout a single trial call goes through and closes the breaker
+    time.sleep(service.breaker.reset_timeout)
+    expected = f"Reply from call {backend.calls + 1}."
+    assert service.get_response("hello") == expected
+    assert service.breaker.state == CircuitBreaker.CLOSED and service.breaker.failures == 0
+    print("ok   trial call after reset_timeout closed the breaker")
+
+    # Running out of the caller's deadline is not the backend's fault
+    backend.script = [(0.5, None)] * (2 * (service.breaker.failure_threshold + 1))
+    for _ in range(service.breaker.failure_threshold + 1):
+        with deadline_scope(Deadline(0.1)):
+            try:
+                service.get_response("hello")
+                raise AssertionError("deadline did not time out")
+            except TimeoutError:
+                pass
+    assert service.breaker.state == CircuitBreaker.CLOSED and service.breaker.failures == 0
+    print("ok   deadline timeouts did not count as breaker failures")
@@ -0,0 +1,154 @@
+"""
+Local retrieval over what the assistant remembers
+
+Memories, contacts and past conversation turns are kept in a TF-IDF index
+that is updated one document at a time. For each LLM query the most
+relevant snippets are picked under a fixed token budget, so answers can be
+personal without the prompt growing along with the memory.
+"""
+import re
+import threading
+from typing import Dict, List, NamedTuple, Tuple
+import numpy as np
+import config
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+_STOPWORDS = frozenset("""
+a an and are as at be but by do does for from has have how i i'm in is it it's me my of on or
+so that the their this to was were what when where which who why will with you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-case terms, leaving out stop words"""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token for English)"""
+    return len(text) // 4 + 1
+
+class _Matrix(NamedTuple):
+    """Sparse document-term weights, rebuilt only after the index changes"""
+    keys: List[str]
+    rows: np.ndarray
+    columns: np.ndarray
+    weights: np.ndarray
+    norms: np.ndarray
+    idf: np.ndarray
+
+class MemoryIndex:
+    def __init__(self):
+        """Initialize an empty index"""
+        self.vocabulary: Dict[str, int] = {}
+        self.document_frequency: List[int] = []
+        # key -> (text, term ids, term counts)
+        self.documents: Dict[str, Tuple[str, np.ndarray, np.ndarray]] = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def add(self, key: str, text: str) -> None:
+        """
+        Add a document, replacing any earlier document with the same key
+
+        Args:
+            key: Identifies the document, e.g. "contact:alice"
+            text: The snippet returned when the document matches
+        """
+        terms = tokenize(text)
+        with self._lock:
+            self._remove(key)
+            if not terms:
+                return
+            ids = []
+            for term in terms:
+                if term not in self.vocabulary:
+                    self.vocabulary[term] = len(self.vocabulary)
+                    self.document_frequency.append(0)
+                ids.append(self.vocabulary[term])
+            term_ids, counts = np.unique(np.array(ids, dtype=np.int64), return_counts=True)
+            for term_id in term_ids:
+                self.document_frequency[term_id] += 1
+            self.documents[key] = (text, term_ids, counts)
+            self._matrix = None
+
+    def remove(self, key: str) -> None:
+        """Remove a document if it is in the index"""
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        for term_id in document[1]:
+            self.document_frequency[term_id] -= 1
+        self._matrix = None
+
+    def _build(self) -> _Matrix:
+        """Compute TF-IDF weights for every document"""
+        keys = list(self.documents)
+        df = np.array(self.document_frequency, dtype=np.float64)
+        idf = np.log((1 + len(keys)) / (1 + df)) + 1
+        if not keys:
+            empty = np.zeros(0)
+            return _Matrix(keys, empty.astype(np.int64), empty.astype(np.int64), empty, empty, idf)
+
+        columns = np.concatenate([self.documents[key][1] for key in keys])
+        counts = np.concatenate([self.documents[key][2] for key in keys])
+        rows = np.repeat(np.arange(len(keys)), [len(self.documents[key][1]) for key in keys])
+        weights = (1 + np.log(counts)) * idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(keys)))
+        return _Matrix(keys, rows, columns, weights, norms, idf)
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Find the documents most similar to a query
+
+        Returns:
+            (text, cosine similarity) pairs, best first
+        """
+        with self._lock:
+            ids = [self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary]
+            if not ids or not self.documents:
+                return []
+            if self._matrix is None:
+                self._matrix = self._build()
+            matrix = self._matrix
+            texts = [self.documents[key][0] for key in matrix.keys]
+
+        term_ids, counts = np.unique(np.array(ids, dtype=np.int64), return_counts=True)
+        query_vector = np.zeros(len(matrix.idf))
+        query_vector[term_ids] = (1 + np.log(counts)) * matrix.idf[term_ids]
+        query_norm = np.linalg.norm(query_vector)
+
+        dots = np.bincount(matrix.rows, weights=matrix.weights * query_vector[matrix.columns],
+                           minlength=len(matrix.keys))
+        scores = dots / (matrix.norms * query_norm)
+        best = np.argsort(-scores)[:top_k]
+        return [(texts[i], float(scores[i])) for i in best if scores[i] > 0]
+
+    def context(self, query: str, top_k: int = None, token_budget: int = None) -> List[str]:
+        """
+        Pick the snippets to add to an LLM prompt
+
+        Args:
+            query: The user's question
+            top_k: Most snippets to consider
+            token_budget: Most tokens the snippets may use together
+
+        Returns:
+            Relevant snippets, best first, within the budget
+        """
+        top_k = config.RETRIEVAL_TOP_K if top_k is None else top_k
+        budget = config.RETRIEVAL_TOKEN_BUDGET if token_budget is None else token_budget
+        snippets = []
+        for text, score in self.search(query, top_k):
+            if score < config.RETRIEVAL_MIN_SCORE:
+                break
+            cost = estimate_tokens(text)
+            if cost > budget:
+                # A smaller, less relevant snippet may still fit
+                continue
+            snippets.append(text)
+            budget -= cost
+        return snippets
@@ -1,36 +1,111 @@
 """
 Speech recognition and text-to-speech functionality
 """
+import threading
 import pyttsx3
 import speech_recognition as sr
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 import config
+from recognizers import RecognizerRace, create_default_race
+from speech_output import CHATTER, RESPONSE, URGENT, SpeechOutput
+from vad import AdaptiveEndpointer, VoiceActivityDetector, capture_utterance
 
 class SpeechEngine:
-    def __init__(self):
-        """Initialize the speech engine"""
-        self.engine = pyttsx3.init('sapi5')
-        self.voices = self.engine.getProperty('voices')
-        self.engine.setProperty('voice', self.voices[config.DEFAULT_VOICE_ID].id)
+    def __init__(self, source_factory: Optional[Callable[[], sr.AudioSource]] = None,
+                 recognition: Optional[RecognizerRace] = None, tts: bool = True):
+        """
+        Initialize the speech engine
+        
+        Args:
+            source_factory: Creates the audio source to listen on; defaults to the
+                microphone (see audio_sources.py for WAV and in-memory replay)
+            recognition: Recognition engines to use instead of config.RECOGNITION_ENGINES
+            tts: Whether to speak out loud; when False replies are only printed
+        """
+        self.source_factory = source_factory or sr.Microphone
+        # The TTS engine lives on the output thread; every thread speaks through it
+        barge_in = self._watch_for_barge_in if tts and config.BARGE_IN_ENABLED else None
+        self.output = SpeechOutput(self._create_tts if tts else None, barge_in)
+        self.voices = self.output.run_on_engine(lambda engine: engine.getProperty('voices')) or []
         self.recognizer = sr.Recognizer()
         self.recognizer.pause_threshold = config.PAUSE_THRESHOLD
+        # Commands learn the user's pace; the wake word has its own short cap
+        self.endpointer = AdaptiveEndpointer()
+        self.wake_endpointer = AdaptiveEndpointer(max_utterance=config.WAKE_WORD_MAX_SECONDS)
+        # Every configured locale/engine recognizes the same audio at once
+        self.recognition = recognition or create_default_race(self.recognizer)
+
+    def _create_tts(self):
+        """Create the pyttsx3 engine (called on the output thread)"""
+        engine = pyttsx3.init('sapi5')
+        voices = engine.getProperty('voices')
+        engine.setProperty('voice', voices[config.DEFAULT_VOICE_ID].id)
+        return engine
+
+    def speak(self, text: str, priority: int = RESPONSE, wait: bool = True) -> bool:
+        """
+        Convert text to speech and play it
+        
+        Args:
+            text: What to say
+            priority: URGENT, RESPONSE or CHATTER (see speech_output.py)
+            wait: Return only once the text has been said
+            
+        Returns:
+            bool: False if the user interrupted or the text was dropped
+        """
+        return self.output.say(text, priority, wait)
 
-    def speak(self, text: str) -> None:
-        """Convert text to speech and play it"""
-        print(f"Assistant: {text}")
-        self.engine.say(text)
-        self.engine.runAndWait()
+    def chatter(self, text: str) -> None:
+        """Say filler such as "Let me think about that..." without waiting for it"""
+        self.output.say(text, CHATTER, wait=False)
+
+    def announce(self, text: str) -> None:
+        """Say an urgent message, such as a reminder, from any thread"""
+        self.output.say(text, URGENT, wait=False)
 
     def set_voice(self, voice_id: int) -> None:
         """Change the voice of the assistant"""
         if voice_id < len(self.voices):
-            self.engine.setProperty('voice', self.voices[voice_id].id)
+            self.output.run_on_engine(lambda engine: engine.setProperty('voice', self.voices[voice_id].id))
             return True
         return False
 
     def adjust_rate(self, rate: int) -> None:
         """Adjust the speaking rate (default is 200)"""
-        self.engine.setProperty('rate', rate)
+        self.output.run_on_engine(lambda engine: engine.setProperty('rate', rate))
+
+    def _watch_for_barge_in(self, done: threading.Event) -> None:
+        """Interrupt a long answer when the user starts talking over it"""
+        try:
+            with self.source_factory() as source:
+                # Well above the normal threshold so the assistant's own voice doesn't count
+                detector = VoiceActivityDetector(self.recognizer.energy_threshold * config.BARGE_IN_ENERGY_RATIO,
+                                                 source.SAMPLE_RATE, dynamic=False)
+                frame_seconds = source.CHUNK / source.SAMPLE_RATE
+                speech = 0.0
+                while not done.is_set():
+                    frame = source.stream.read(source.CHUNK)
+                    speech = speech + frame_seconds if detector.is_speech(frame, source.SAMPLE_WIDTH) else 0.0
+                    if speech >= config.BARGE_IN_MIN_SPEECH:
+                        print("Interrupted by the user")
+                        self.output.interrupt()
+                        return
+        except Exception as e:
+            print(f"Error watching for barge-in: {e}")
+
+    def _record(self, source, timeout: Optional[float], endpointer: AdaptiveEndpointer) -> sr.AudioData:
+        """
+        Record one utterance, ending it as soon as the user stops speaking
+        
+        Raises:
+            sr.WaitTimeoutError: If no speech started before the timeout
+        """
+        detector = VoiceActivityDetector(self.recognizer.energy_threshold, source.SAMPLE_RATE)
+        frame_data = capture_utterance(source, detector, endpointer, timeout)
+        if frame_data is None:
+            raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+        return sr.AudioData(frame_data, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
 
     def listen(self, timeout: int = 8, retries: int = 1) -> Tuple[bool, str]:
         """
@@ -41,24 +116,24 @@ class SpeechEngine:
             timeout: How long to wait for a command (seconds)
             retries: Number of times to retry if recognition fails
         """
-        for attempt in range(retries + 1):
-            with sr.Microphone() as source:
-                print("Listening...")
-                # More extensive ambient noise adjustment
-                self.recognizer.adjust_for_ambient_noise(source, duration=1.0)
-                # Lower energy threshold to make it more sensitive
-                self.recognizer.energy_threshold = 300  # Default is usually 300-500
+        # Don't record the assistant's own voice
+        self.output.wait_until_idle()
+        # Keep the microphone open across retries instead of reopening and recalibrating it
+        with self.source_factory() as source:
+            print("Listening...")
+            # More extensive ambient noise adjustment
+            self.recognizer.adjust_for_ambient_noise(source, duration=1.0)
+            # Lower energy threshold to make it more sensitive
+            self.recognizer.energy_threshold = 300  # Default is usually 300-500
+            
+            for attempt in range(retries + 1):
                 try:
-                    audio = self.recognizer.listen(source, timeout=timeout)
+                    audio = self._record(source, timeout, self.endpointer)
                     print("Recognizing...")
-                    # Try Google first, with both language options
-                    try:
-                        text = self.recognizer.recognize_google(audio, language=config.LANGUAGE)
-                    except:
-                        # Fallback to English if regional language fails
-                        text = self.recognizer.recognize_google(audio, language="en-US")
+                    # All locales at once; no second round trip when the first one fails
+                    text, confidence, engine = self.recognition.recognize(audio)
                         
-                    print(f"User said: {text}")
+                    print(f"User said: {text} ({engine}, confidence {confidence:.2f})")
                     return True, text.lower()
                 except sr.WaitTimeoutError:
                     if attempt < retries:
@@ -78,11 +153,12 @@ class SpeechEngine:
 
     def listen_for_wake_word(self) -> bool:
         """Listen specifically for the wake word"""
-        with sr.Microphone() as source:
+        self.output.wait_until_idle()
+        with self.source_factory() as source:
             print("Listening for wake word...")
             self.recognizer.adjust_for_ambient_noise(source)
             try:
-                audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=3)
+                audio = self._record(source, 1, self.wake_endpointer)
                 text = self.recognizer.recognize_google(audio, language=config.LANGUAGE).lower()
                 print(f"Heard: {text}")
                 return config.WAKE_WORD.lower() in text
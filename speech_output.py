@@ -0,0 +1,258 @@
+"""
+Prioritized speech output for the voice assistant
+
+pyttsx3 engines are not thread-safe, yet reminders fire from a background
+thread while the main loop is speaking. SpeechOutput owns the engine on a
+single worker thread and takes utterances from any thread:
+
+- URGENT (reminders) jump ahead of everything and pause a longer answer
+  at the next sentence boundary; urgent messages queued together are
+  spoken as one
+- RESPONSE is the answer to the user's command
+- CHATTER ("Let me think about that...") is dropped if it can't be said
+  right away
+- interrupt() cuts off the current answer when the user starts talking
+"""
+import heapq
+import itertools
+import re
+import threading
+import time
+from typing import Any, Callable, List, Optional
+import config
+
+URGENT = 0
+RESPONSE = 1
+CHATTER = 2
+
+# Engine commands run before any queued utterance
+_COMMAND = -1
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, the points where speech can be paused"""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+class _Utterance:
+    """Queued text, or an engine command, and the event its caller waits on"""
+
+    def __init__(self, priority: int, text: str = "", command: Optional[Callable[[Any], Any]] = None):
+        self.priority = priority
+        self.sentences = split_sentences(text)
+        self.command = command
+        self.created_at = time.monotonic()
+        self.done = threading.Event()
+        self.spoken = False
+        self.result = None
+        # Urgent messages spoken together with this one
+        self.merged = [self]
+
+    def finish(self, spoken: bool) -> None:
+        self.spoken = spoken
+        self.done.set()
+
+class SpeechOutput:
+    def __init__(self, engine_factory: Optional[Callable[[], Any]] = None,
+                 barge_in: Optional[Callable[[threading.Event], None]] = None):
+        """
+        Initialize the speech output arbiter
+
+        Args:
+            engine_factory: Creates the pyttsx3 engine on the worker thread;
+                without one, utterances are only printed
+            barge_in: Watches for the user talking over a long answer and calls
+                interrupt(); runs on its own thread until the event is set
+        """
+        self.engine_factory = engine_factory
+        self.barge_in = barge_in
+        self.engine = None
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._current: Optional[_Utterance] = None
+        self._interrupted = False
+        self._ready = threading.Event()
+        self.worker = threading.Thread(target=self._run, daemon=True, name="speech-output")
+        self.worker.start()
+        self._ready.wait()
+
+    def say(self, text: str, priority: int = RESPONSE, wait: bool = True) -> bool:
+        """
+        Queue text to be spoken
+
+        Args:
+            text: What to say
+            priority: URGENT, RESPONSE or CHATTER
+            wait: Block until the text has been spoken, interrupted or dropped
+
+        Returns:
+            bool: True if it was spoken to the end (always True when not waiting)
+        """
+        utterance = _Utterance(priority, text)
+        if not utterance.sentences:
+            return True
+        self._put(utterance)
+        if not wait:
+            return True
+        utterance.done.wait()
+        return utterance.spoken
+
+    def run_on_engine(self, command: Callable[[Any], Any]) -> Any:
+        """
+        Run a function with the TTS engine on the worker thread, e.g. to change the voice
+
+        Returns:
+            The function's result, or None without an engine
+        """
+        if threading.current_thread() is self.worker:
+            return command(self.engine) if self.engine else None
+        utterance = _Utterance(_COMMAND, command=command)
+        self._put(utterance)
+        utterance.done.wait()
+        return utterance.result
+
+    def interrupt(self) -> None:
+        """Stop the answer being spoken and drop queued answers and chatter (barge-in)"""
+        with self._condition:
+            if self._current and self._current.priority != URGENT:
+                self._interrupted = True
+            dropped = [entry for entry in self._queue if entry[2].priority > URGENT]
+            self._queue = [entry for entry in self._queue if entry[2].priority <= URGENT]
+            heapq.heapify(self._queue)
+        for _, _, utterance in dropped:
+            utterance.finish(False)
+
+    def is_speaking(self) -> bool:
+        """Check whether anything is being said or waiting to be said"""
+        with self._condition:
+            return self._current is not None or bool(self._queue)
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until nothing is being said, e.g. before opening the microphone
+
+        Returns:
+            bool: True if the output went quiet before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._current is not None or self._queue:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def _put(self, utterance: _Utterance, sequence: Optional[int] = None) -> None:
+        dropped = []
+        with self._condition:
+            if utterance.priority == RESPONSE:
+                # The answer is ready, so filler still waiting to be said is pointless
+                dropped = [entry[2] for entry in self._queue if entry[0] == CHATTER]
+                self._queue = [entry for entry in self._queue if entry[0] != CHATTER]
+                heapq.heapify(self._queue)
+            heapq.heappush(self._queue, (utterance.priority, next(self._sequence) if sequence is None else sequence,
+                                         utterance))
+            self._condition.notify_all()
+        for chatter in dropped:
+            chatter.finish(False)
+
+    def _next(self):
+        """Wait for the next utterance, merging urgent messages queued together"""
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            priority, sequence, utterance = heapq.heappop(self._queue)
+            self._current = utterance
+
+            if priority == URGENT and not utterance.command:
+                # Reminders due at the same minute arrive one after another
+                deadline = time.monotonic() + config.SPEECH_MERGE_WINDOW
+                while time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+                merged = [utterance]
+                while self._queue and self._queue[0][0] == URGENT and not self._queue[0][2].command:
+                    merged.append(heapq.heappop(self._queue)[2])
+                if len(merged) > 1:
+                    combined = _Utterance(URGENT)
+                    combined.sentences = [s for u in merged for s in u.sentences]
+                    combined.merged = merged
+                    utterance = combined
+
+            self._current = utterance
+            self._interrupted = False
+            return sequence, utterance
+
+    def _preempted(self, utterance: _Utterance) -> bool:
+        """Check whether something more important is waiting"""
+        with self._condition:
+            return bool(self._queue) and self._queue[0][0] < utterance.priority
+
+    def _on_word(self, name, location, length) -> None:
+        # Called by pyttsx3 on the worker thread, so stopping the engine here is safe
+        if self._interrupted:
+            self.engine.stop()
+
+    def _speak(self, sentence: str) -> None:
+        print(f"Assistant: {sentence}")
+        if self.engine:
+            self.engine.say(sentence)
+            self.engine.runAndWait()
+
+    def _run(self) -> None:
+        """Worker thread that owns the TTS engine"""
+        try:
+            if self.engine_factory:
+                self.engine = self.engine_factory()
+                self.engine.connect("started-word", self._on_word)
+        except Exception as e:
+            print(f"Error initializing text-to-speech: {e}")
+            self.engine = None
+        self._ready.set()
+
+        while True:
+            sequence, utterance = self._next()
+            if utterance.command:
+                try:
+                    utterance.result = utterance.command(self.engine) if self.engine else None
+                except Exception as e:
+                    print(f"Error configuring text-to-speech: {e}")
+                self._finish(utterance, True)
+                continue
+
+            if utterance.priority == CHATTER and time.monotonic() - utterance.created_at > config.SPEECH_CHATTER_MAX_AGE:
+                # Filler is pointless once the real answer is ready
+                self._finish(utterance, False)
+                continue
+
+            watcher = None
+            if (self.barge_in and utterance.priority == RESPONSE
+                    and sum(len(s) for s in utterance.sentences) >= config.BARGE_IN_MIN_CHARS):
+                watcher = threading.Event()
+                threading.Thread(target=self.barge_in, args=(watcher,), daemon=True).start()
+
+            try:
+                while utterance.sentences and not self._interrupted:
+                    if self._preempted(utterance):
+                        # Say the reminder now and pick this answer up again afterwards
+                        with self._condition:
+                            self._current = None
+                        self._put(utterance, sequence)
+                        utterance = None
+                        break
+                    self._speak(utterance.sentences.pop(0))
+            except Exception as e:
+                print(f"Error in text-to-speech: {e}")
+            finally:
+                if watcher:
+                    watcher.set()
+            if utterance:
+                self._finish(utterance, not utterance.sentences and not self._interrupted)
+
+    def _finish(self, utterance: _Utterance, spoken: bool) -> None:
+        with self._condition:
+            self._current = None
+            self._condition.notify_all()
+        for part in utterance.merged:
+            part.finish(spoken)
@@ -0,0 +1,169 @@
+"""
+Request coalescing and rate limiting for external APIs
+
+- SingleFlight merges concurrent identical calls into one request whose
+  result every caller shares
+- TokenBucket keeps each provider within its request rate and its
+  free-tier quota, letting user requests queue briefly while background
+  work backs off
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+class RateLimitedError(Exception):
+    """Raised when a provider's rate limit or quota leaves no room for a request"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} rate limit reached, retry in {retry_after:.0f} seconds")
+        self.provider = provider
+        self.retry_after = retry_after
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, quota: Optional[int] = None, quota_period: float = 86400):
+        """
+        Initialize the token bucket
+
+        Args:
+            rate: Tokens added per second
+            capacity: Largest burst of requests allowed at once
+            quota: Requests allowed per quota period (None for no quota)
+            quota_period: Length of the quota period in seconds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.quota = quota
+        self.quota_period = quota_period
+        self.tokens = float(capacity)
+        self.quota_used = 0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._quota_start = self._updated
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens earned since the last update and roll the quota period"""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if now - self._quota_start >= self.quota_period:
+            self._quota_start = now
+            self.quota_used = 0
+
+    def quota_remaining(self) -> Optional[int]:
+        """Get the requests left in the current quota period (None if there is no quota)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return None if self.quota is None else max(0, self.quota - self.quota_used)
+
+    def retry_after(self) -> float:
+        """Get the seconds until a request would be allowed"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.quota is not None and self.quota_used >= self.quota:
+                return self._quota_start + self.quota_period - now
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self, timeout: float = 0, reserve: int = 0) -> bool:
+        """
+        Take a token for one request
+
+        Args:
+            timeout: Seconds to queue for a token before giving up
+            reserve: Quota to leave untouched, so background work can't use up
+                what user requests need
+
+        Returns:
+            bool: True if the request may be sent
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.quota is not None and self.quota - self.quota_used <= reserve:
+                    # Waiting won't help until the quota period rolls over
+                    self.throttled += 1
+                    return False
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.quota_used += 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+                if now + wait > deadline:
+                    self.throttled += 1
+                    return False
+            time.sleep(wait)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get the bucket's current state for monitoring"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "tokens": round(self.tokens, 2),
+                "capacity": self.capacity,
+                "quota": self.quota,
+                "quota_remaining": None if self.quota is None else max(0, self.quota - self.quota_used),
+                "throttled": self.throttled,
+            }
+
+class _Flight:
+    """One in-flight call and the result its callers are waiting for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    def __init__(self):
+        """Initialize the single-flight group"""
+        self.coalesced = 0
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Call fn, or wait for the call with the same key that is already running
+
+        Args:
+            key: Identifies identical calls, e.g. the response cache key
+            fn: The call to make
+
+        Returns:
+            The result of fn, shared by every caller with this key
+
+        Raises:
+            The exception raised by fn, in every caller
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def in_flight(self) -> int:
+        """Get the number of calls currently running"""
+        with self._lock:
+            return len(self._flights)
@@ -4,6 +4,9 @@ Utility functions for the voice assistant
 import datetime
 import os
 import json
+import subprocess
+import sys
+import tempfile
 import webbrowser
 from typing import Dict, List, Any, Optional
 
@@ -32,14 +35,31 @@ def open_website(url: str) -> None:
     webbrowser.open(url)
 
 def open_application(path: str) -> bool:
-    """Opens an application at the specified path"""
+    """Opens an application at the specified path without waiting for it"""
     try:
-        os.startfile(path)
+        if sys.platform == "win32":
+            os.startfile(path)
+        else:
+            subprocess.Popen([path], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL, start_new_session=True)
         return True
     except Exception as e:
         print(f"Error opening application: {e}")
         return False
 
+def open_file(path: str) -> bool:
+    """Opens a file with its default application (e.g. plays a song)"""
+    try:
+        if sys.platform == "win32":
+            os.startfile(path)
+        else:
+            opener = "open" if sys.platform == "darwin" else "xdg-open"
+            subprocess.Popen([opener, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return True
+    except Exception as e:
+        print(f"Error opening file: {e}")
+        return False
+
 def save_to_json(data: Dict, filepath: str) -> bool:
     """Saves dictionary data to a JSON file"""
     try:
@@ -50,6 +70,25 @@ def save_to_json(data: Dict, filepath: str) -> bool:
         print(f"Error saving to JSON: {e}")
         return False
 
+def save_to_json_atomic(data: Dict, filepath: str) -> bool:
+    """Saves data to a JSON file so that readers only ever see the old or the new file"""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    try:
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, filepath)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return True
+    except Exception as e:
+        print(f"Error saving to JSON: {e}")
+        return False
+
 def load_from_json(filepath: str) -> Optional[Dict]:
     """Loads data from a JSON file"""
     try:
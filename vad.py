@@ -0,0 +1,249 @@
+"""
+Voice activity detection and adaptive endpointing
+
+speech_recognition waits for a fixed pause (config.PAUSE_THRESHOLD) after
+the user stops talking before it even starts recognizing. Here each audio
+frame is classified as speech or silence, and the trailing silence that
+ends an utterance is learned from the pauses the user makes inside their
+own recent utterances, so a fast speaker isn't kept waiting for a full
+second. A hard cap stops runaway recordings in noisy rooms.
+"""
+import math
+from array import array
+from collections import deque
+from typing import List, Optional
+import config
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+def frame_energy(frame: bytes, sample_width: int = 2) -> float:
+    """Root-mean-square energy of a frame of signed little-endian PCM"""
+    if sample_width != 2 or len(frame) < 2:
+        samples = [b - 128 for b in frame] if sample_width == 1 else []
+    else:
+        samples = array("h", frame[:len(frame) - len(frame) % 2])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+class VoiceActivityDetector:
+    def __init__(self, energy_threshold: float = 300, sample_rate: int = 16000, dynamic: bool = True):
+        """
+        Initialize the voice activity detector
+
+        Uses webrtcvad when it is installed, otherwise an energy threshold
+        that follows the background noise level.
+
+        Args:
+            energy_threshold: Minimum frame energy treated as speech
+            sample_rate: Sample rate of the audio in Hz
+            dynamic: Raise the threshold when the background gets louder
+        """
+        self.energy_threshold = energy_threshold
+        self.sample_rate = sample_rate
+        self.dynamic = dynamic
+        self.noise_floor = energy_threshold / config.VAD_NOISE_RATIO
+        self._webrtc = None
+        if webrtcvad is not None and sample_rate in (8000, 16000, 32000, 48000):
+            self._webrtc = webrtcvad.Vad(config.VAD_AGGRESSIVENESS)
+
+    def threshold(self) -> float:
+        """Current energy threshold for speech"""
+        return max(self.energy_threshold, self.noise_floor * config.VAD_NOISE_RATIO)
+
+    def is_speech(self, frame: bytes, sample_width: int = 2) -> bool:
+        """Classify one frame of audio as speech or silence"""
+        energy = frame_energy(frame, sample_width)
+        speech = energy > self.threshold()
+
+        if self._webrtc is not None and sample_width == 2:
+            # webrtcvad only accepts 10, 20 or 30 ms frames
+            step = self.sample_rate * 30 // 1000 * 2
+            chunks = [frame[i:i + step] for i in range(0, len(frame) - step + 1, step)]
+            if chunks:
+                votes = sum(self._webrtc.is_speech(chunk, self.sample_rate) for chunk in chunks)
+                speech = speech and votes * 2 >= len(chunks)
+
+        if not speech and self.dynamic:
+            # Track the background level from silent frames only
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy
+        return speech
+
+class AdaptiveEndpointer:
+    def __init__(self, min_silence: Optional[float] = None, max_silence: Optional[float] = None,
+                 max_utterance: Optional[float] = None):
+        """
+        Initialize the endpointer
+
+        Args:
+            min_silence: Shortest trailing silence (seconds) that can end an utterance
+            max_silence: Longest trailing silence; also used until the user's pace is known
+            max_utterance: Hard cap on utterance length in seconds
+        """
+        self.min_silence = config.ENDPOINT_MIN_SILENCE if min_silence is None else min_silence
+        self.max_silence = config.PAUSE_THRESHOLD if max_silence is None else max_silence
+        self.max_utterance = config.MAX_UTTERANCE_SECONDS if max_utterance is None else max_utterance
+        # Pauses the user made inside recent utterances
+        self.pauses = deque(maxlen=config.ENDPOINT_PAUSE_HISTORY)
+        self.reset()
+
+    def reset(self) -> None:
+        """Prepare for a new utterance"""
+        self.started = False
+        self.speech_time = 0.0
+        self.silence_time = 0.0
+        self.elapsed = 0.0
+        self._current_pauses: List[float] = []
+
+    def trailing_silence(self) -> float:
+        """Silence (seconds) after speech that ends the current utterance"""
+        if len(self.pauses) < config.ENDPOINT_MIN_PAUSES:
+            return self.max_silence
+        pauses = sorted(self.pauses)
+        # Wait a little longer than almost every pause the user makes mid-sentence
+        typical = pauses[int(0.9 * (len(pauses) - 1))]
+        return min(self.max_silence, max(self.min_silence, typical * config.ENDPOINT_PAUSE_MARGIN))
+
+    def update(self, is_speech: bool, frame_seconds: float) -> bool:
+        """
+        Feed the classification of one frame
+
+        Args:
+            is_speech: Whether the frame contains speech
+            frame_seconds: Duration of the frame
+
+        Returns:
+            bool: True once the utterance is complete
+        """
+        if not self.started:
+            if is_speech:
+                self.started = True
+                self.speech_time = frame_seconds
+            return False
+
+        self.elapsed += frame_seconds
+        if is_speech:
+            if self.silence_time > 0:
+                self._current_pauses.append(self.silence_time)
+            self.silence_time = 0.0
+            self.speech_time += frame_seconds
+        else:
+            self.silence_time += frame_seconds
+
+        if self.elapsed >= self.max_utterance:
+            return True
+        return self.silence_time >= self.trailing_silence()
+
+    def finish(self) -> None:
+        """Learn from the utterance that just ended"""
+        self.pauses.extend(self._current_pauses)
+        self.reset()
+
+def capture_utterance(source, detector: VoiceActivityDetector, endpointer: AdaptiveEndpointer,
+                      timeout: Optional[float] = None) -> Optional[bytes]:
+    """
+    Record one utterance from a speech_recognition AudioSource
+
+    Args:
+        source: Open audio source with stream, CHUNK, SAMPLE_RATE and SAMPLE_WIDTH
+        detector: Voice activity detector
+        endpointer: Endpointer deciding when the utterance is over
+        timeout: Seconds to wait for speech to start (None waits forever)
+
+    Returns:
+        Raw PCM of the utterance, or None if no speech started before the timeout
+    """
+    frame_seconds = source.CHUNK / source.SAMPLE_RATE
+    # Keep a little audio from before speech starts so the first syllable isn't clipped
+    preroll = deque(maxlen=max(1, int(config.ENDPOINT_PREROLL / frame_seconds)))
+    frames = []
+    waited = 0.0
+    endpointer.reset()
+
+    while True:
+        frame = source.stream.read(source.CHUNK)
+        if not frame:
+            break
+        speech = detector.is_speech(frame, source.SAMPLE_WIDTH)
+        done = endpointer.update(speech, frame_seconds)
+
+        if not endpointer.started:
+            preroll.append(frame)
+            waited += frame_seconds
+            if timeout is not None and waited > timeout:
+                return None
+            continue
+
+        if not frames:
+            frames.extend(preroll)
+        frames.append(frame)
+        if done:
+            break
+
+    if not endpointer.started:
+        return None
+    # Trailing silence adds nothing for the recognizer
+    trailing = int(endpointer.silence_time / frame_seconds)
+    if trailing and trailing < len(frames):
+        frames = frames[:len(frames) - trailing]
+    endpointer.finish()
+    return b"".join(frames)
+
+if __name__ == "__main__":
+    # Benchmark: endpointing latency saved versus a fixed pause threshold
+    import random
+    import sys
+    import wave
+
+    def read_wav(path):
+        with wave.open(path, "rb") as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit mono audio")
+            return wav.readframes(wav.getnframes()), wav.getframerate()
+
+    def synthetic_command(rate, words, gap):
+        """Tone bursts for words separated by short gaps, followed by 2 s of silence"""
+        noise = lambda n: array("h", (random.randint(-60, 60) for _ in range(n)))
+        pcm = array("h")
+        pcm.extend(noise(int(0.5 * rate)))
+        for _ in range(words):
+            pcm.extend(array("h", (int(3000 * math.sin(i / 3)) for i in range(int(0.3 * rate)))))
+            pcm.extend(noise(int(gap * rate)))
+        pcm.extend(noise(2 * rate))
+        return pcm.tobytes(), rate
+
+    def endpoint_time(pcm, rate, endpointer, chunk=1024):
+        """Seconds from the last speech frame until the endpointer fires"""
+        detector = VoiceActivityDetector(energy_threshold=300, sample_rate=rate)
+        frame_seconds = chunk / rate
+        endpointer.reset()
+        for offset in range(0, len(pcm), chunk * 2):
+            if endpointer.update(detector.is_speech(pcm[offset:offset + chunk * 2]), frame_seconds):
+                waited = endpointer.silence_time
+                endpointer.finish()
+                return waited
+        return None
+
+    random.seed(0)
+    if len(sys.argv) > 1:
+        fixtures = [(path, read_wav(path)) for path in sys.argv[1:]]
+    else:
+        fixtures = [(f"synthetic-{i}", synthetic_command(16000, random.randint(3, 7), random.uniform(0.1, 0.3)))
+                    for i in range(12)]
+
+    adaptive = AdaptiveEndpointer()
+    fixed = AdaptiveEndpointer(min_silence=config.PAUSE_THRESHOLD, max_silence=config.PAUSE_THRESHOLD)
+    saved = []
+    for name, (pcm, rate) in fixtures:
+        fixed_wait = endpoint_time(pcm, rate, fixed)
+        adaptive_wait = endpoint_time(pcm, rate, adaptive)
+        if fixed_wait is None or adaptive_wait is None:
+            print(f"{name}: no endpoint found")
+            continue
+        saved.append(fixed_wait - adaptive_wait)
+        print(f"{name}: fixed {fixed_wait * 1000:.0f} ms, adaptive {adaptive_wait * 1000:.0f} ms")
+    if saved:
+        print(f"Average trailing-silence latency saved: {sum(saved) / len(saved) * 1000:.0f} ms per command")
@@ -0,0 +1,185 @@
+"""
+Wikipedia summaries for the voice assistant
+
+A spoken topic is resolved to an article title and its short extract is
+fetched with one request to the REST summary endpoint, which follows
+redirects itself. Disambiguation pages are resolved to the top search
+result instead of failing. Both the topic-to-title resolution and the
+summaries are cached, so a repeated question needs no request at all.
+"""
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote
+import requests
+import config
+from cache import ResponseCache
+from deadlines import request_timeout
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a spoken topic for the title cache"""
+    return " ".join(topic.lower().split()).strip(" ?.!")
+
+def first_sentences(text: str, count: int) -> str:
+    """Get the first sentences of an extract"""
+    return " ".join(_SENTENCE_END.split(text.strip())[:count])
+
+class WikipediaClient:
+    def __init__(self, session: Optional[requests.Session] = None, rest_url: Optional[str] = None,
+                 api_url: Optional[str] = None, timeout: float = 5):
+        """
+        Initialize the Wikipedia client
+
+        Args:
+            session: HTTP session to reuse pooled connections from
+            rest_url: Base URL of the REST API (a local stub server in tests)
+            api_url: URL of the action API, used for search
+            timeout: Seconds to wait for each request
+        """
+        self.session = session or requests.Session()
+        self.rest_url = (rest_url or config.WIKIPEDIA_REST_URL).rstrip("/")
+        self.api_url = api_url or config.WIKIPEDIA_API_URL
+        self.timeout = timeout
+        self.titles = ResponseCache(config.WIKIPEDIA_CACHE_TTL)
+        self.summaries = ResponseCache(config.WIKIPEDIA_CACHE_TTL)
+        self.requests_sent = 0
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        self.requests_sent += 1
+        return self.session.get(url, timeout=request_timeout(self.timeout),
+                                headers={"User-Agent": config.WIKIPEDIA_USER_AGENT}, **kwargs)
+
+    def _fetch_summary(self, title: str) -> Optional[dict]:
+        """Fetch a page summary, or None if there is no such page"""
+        url = f"{self.rest_url}/page/summary/{quote(title.replace(' ', '_'), safe='')}"
+        response = self._get(url, params={"redirect": "true"})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def _search(self, topic: str, exclude: str = "") -> Optional[str]:
+        """Find the best matching article title for a topic"""
+        response = self._get(self.api_url, params={
+            "action": "query", "list": "search", "srsearch": topic,
+            "srlimit": 5, "format": "json",
+        })
+        response.raise_for_status()
+        for result in response.json().get("query", {}).get("search", []):
+            title = result.get("title", "")
+            if title and title != exclude and "(disambiguation)" not in title:
+                return title
+        return None
+
+    def _resolve(self, topic: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Find the article for a topic
+
+        Returns:
+            The article title and its extract, or (None, None) if nothing was found
+        """
+        page = self._fetch_summary(topic)
+        if page is None:
+            # The topic isn't a title; one search to resolve it
+            title = self._search(topic)
+            if not title:
+                return None, None
+            cached = self.summaries.get(title)
+            if cached:
+                return title, cached
+            page = self._fetch_summary(title)
+        if page is not None and page.get("type") == "disambiguation":
+            # Pick the most likely meaning instead of reading out the list
+            title = self._search(topic, exclude=page.get("title", ""))
+            page = self._fetch_summary(title) if title else None
+        if page is None or not page.get("extract"):
+            return None, None
+        return page.get("title", topic), page["extract"]
+
+    def summary(self, topic: str, sentences: int = 2) -> Tuple[bool, str]:
+        """
+        Get a short summary of a topic
+
+        Args:
+            topic: What to look up, e.g. "black hole"
+            sentences: Number of sentences to return
+
+        Returns:
+            Tuple[bool, str]: Success status and summary or error message
+        """
+        key = normalize_topic(topic)
+        if not key:
+            return False, "What should I look up on Wikipedia?"
+        try:
+            title = self.titles.get(key)
+            extract = self.summaries.get(title) if title else None
+            if extract is None:
+                title, extract = self._resolve(key)
+                if not extract:
+                    return False, f"I couldn't find anything on Wikipedia about {topic.strip()}"
+                self.summaries.set(title, extract)
+            self.titles.set(key, title)
+            return True, first_sentences(extract, sentences)
+        except Exception as e:
+            return False, f"Error searching Wikipedia: {str(e)}"
+
+if __name__ == "__main__":
+    # Check against a local stub server: requests sent per lookup, cold and cached
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qs, unquote, urlparse
+
+    PAGES = {
+        "Black hole": {"type": "standard", "title": "Black hole",
+                       "extract": "A black hole is a region of spacetime where gravity is so strong that nothing can escape. "
+                                  "Albert Einstein's theory of general relativity predicts it. It has an event horizon."},
+        "Mercury": {"type": "disambiguation", "title": "Mercury", "extract": "Mercury may refer to:"},
+        "Mercury (planet)": {"type": "standard", "title": "Mercury (planet)",
+                             "extract": "Mercury is the first planet from the Sun. It is the smallest planet."},
+    }
+    REDIRECTS = {"black_hole": "Black hole", "mercury": "Mercury", "Black_hole": "Black hole", "Mercury": "Mercury",
+                 "Mercury_(planet)": "Mercury (planet)"}
+    SEARCH = {"mercury": ["Mercury", "Mercury (planet)", "Mercury (element)"],
+              "the big dark thing in space": ["Black hole"]}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.startswith("/rest/page/summary/"):
+                title = REDIRECTS.get(unquote(url.path.rsplit("/", 1)[1]))
+                body = PAGES.get(title)
+            else:
+                topic = parse_qs(url.query)["srsearch"][0]
+                body = {"query": {"search": [{"title": t} for t in SEARCH.get(topic, [])]}}
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(body or {}).encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    client = WikipediaClient(rest_url=f"{base}/rest", api_url=f"{base}/api")
+
+    # Topic, requests it should cost, whether it succeeds, and how the answer starts
+    checks = [
+        ("black hole", 1, True, "A black hole is"),
+        ("mercury", 3, True, "Mercury is the first planet"),  # Disambiguation page, resolved to the top candidate
+        ("the big dark thing in space", 2, True, "A black hole is"),  # Search, then the cached summary
+        ("no such topic", 2, False, "I couldn't find anything"),
+        ("Black Hole", 0, True, "A black hole is"),
+        ("mercury", 0, True, "Mercury is the first planet"),
+    ]
+    for topic, expected, expected_success, start in checks:
+        before = client.requests_sent
+        success, text = client.summary(topic)
+        sent = client.requests_sent - before
+        assert (sent, success) == (expected, expected_success) and text.startswith(start), (topic, sent, success, text)
+        print(f"ok   {topic!r}: {sent} request(s): {text}")
+    assert client.titles.get("mercury") == "Mercury (planet)"
+    server.shutdown()